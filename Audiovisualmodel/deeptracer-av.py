@@ -3,8 +3,13 @@ import sys
 import glob
 import time
 import json
+import argparse
+import queue
 import warnings
-from collections import defaultdict
+import threading
+import multiprocessing
+from itertools import islice
+from collections import defaultdict, namedtuple
 import cv2
 import torch
 import torch.nn as nn
@@ -12,12 +17,19 @@ import numpy as np
 from PIL import Image
 from tqdm import tqdm
 from dface import MTCNN, FaceNet
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 import timm.models.efficientnet as effnet
 from sklearn.cluster import DBSCAN
 from torchvision import transforms
 import torchvision.transforms.functional as TF
-from torch.cuda.amp import autocast
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Backend'))
+from model_registry import registry, boot_report
+from precision import TORCH_PRECISIONS, apply_precision, model_device
+from engines import OnnxModel, onnx_path
+from checkpoints import load_module, traced_module
+from face_tracker import FaceTracker
+from face_preprocessing import FacePreprocessor, IMAGENET_MEAN, IMAGENET_STD, crop_range, minmax_uint8
 
 warnings.filterwarnings("ignore")
 
@@ -27,6 +39,28 @@ margin = 0
 scan_fps = 1
 batch_size = 32
 face_size = None
+face_preprocessor = None
+
+# Frame sampling: 'grab' decodes sequentially, 'seek' jumps to every sample,
+# 'auto' seeks whenever samples are more than seek_seconds apart (grab() decodes every frame it skips)
+sample_mode = 'auto'
+seek_seconds = 0.25
+keyframes_only = False
+SAMPLE_MODES = ['auto', 'grab', 'seek']
+
+# Run MTCNN on every track_every-th sampled frame and follow faces with optical flow in between (0 disables)
+track_every = 0
+
+# Online identity clustering: join the nearest identity within cluster_eps (cosine distance),
+# merge two identities only once their centroids come within the stricter merge_eps,
+# split one only once its two halves are further apart than split_eps
+cluster_eps = 0.35
+merge_eps = 0.25
+split_eps = 0.45
+
+# Scan pipeline: queue depth between stages
+queue_size = 4
+report_stats = True
 
 mtcnn = None
 facenet = None
@@ -53,42 +87,129 @@ class EffNet(nn.Module):
 
 
 class Ensemble(nn.Module):
-    def __init__(self, models):
+    def __init__(self, models, order=None, bounds=None):
         super(Ensemble, self).__init__()
-        self.models = nn.ModuleList(models)
+        # onnxruntime members are plain callables rather than modules
+        self.models = nn.ModuleList(models) if all(isinstance(m, nn.Module) for m in models) else list(models)
+        # Cascade mode: run members in `order` and stop once sigmoid(running mean) leaves `bounds`
+        self.order = list(order) if order is not None else list(range(len(models)))
+        self.bounds = bounds
+        self.depth_counts = np.zeros(len(models), dtype=np.int64)
 
     def forward(self, x):
+        if self.bounds is None or len(self.models) == 1:
+            return torch.mean(self.member_outputs(x), dim=0)
+        return self.cascade(x)
+
+    def member_outputs(self, x):
         preds = []
         for i, model in enumerate(self.models):
             y = model(x)
             preds.append(y)
-        final = torch.mean(torch.stack(preds), dim=0)
-        return final
+        return torch.stack(preds)
+
+    def cascade(self, x):
+        low, high = self.bounds
+        sums = torch.zeros(len(x), 1, device=x.device)
+        out = torch.zeros(len(x), 1, device=x.device)
+        active = torch.arange(len(x), device=x.device)
+
+        for depth, i in enumerate(self.order, 1):
+            sums[active] += self.models[i](x[active]).float()
+            mean = sums[active] / depth
+            p = torch.sigmoid(mean[:, 0])
+            decided = (p <= low) | (p >= high) if depth < len(self.order) else torch.ones_like(p, dtype=torch.bool)
+            out[active[decided]] = mean[decided]
+            self.depth_counts[depth - 1] += int(decided.sum())
+            active = active[~decided]
+            if len(active) == 0:
+                break
+        return out
+
+    def depth_stats(self):
+        total = max(int(self.depth_counts.sum()), 1)
+        return {depth: round(count / total, 4) for depth, count in enumerate(self.depth_counts, 1)}
+
+
+def simulate_cascade(member_logits, order, bounds):
+    # Replays the cascade on precomputed member logits of shape (n_models, n_faces)
+    low, high = bounds
+    logits = np.asarray(member_logits, dtype=np.float64)[order]
+    means = np.cumsum(logits, axis=0) / np.arange(1, len(order) + 1)[:, None]
+    probs = 1 / (1 + np.exp(-means))
+    decided = (probs <= low) | (probs >= high)
+    decided[-1] = True
+    depths = decided.argmax(axis=0)
+    return means[depths, np.arange(logits.shape[1])], depths + 1
+
+
+def sample_indices(total, fps, target_fps=1):
+    if target_fps > fps:
+        target_fps = fps
+    nfrm = int(total / fps * target_fps)
+    return np.unique(np.linspace(0, total, nfrm, endpoint=False, dtype=int))
+
+
+def prepare_frame(frm):
+    h, w = frm.shape[:2]
+    if w * h > 1920 * 1080:
+        scale = 1920 / max(w, h)
+        frm = cv2.resize(frm, (int(w * scale), int(h * scale)))
+    return frm
+
+
+def read_frames(vid, idx, seek_gap):
+    # Grab forward over short gaps, seek over long ones; stops after the last sampled frame
+    pos = 0
+    for target in idx:
+        if target - pos > seek_gap:
+            vid.set(cv2.CAP_PROP_POS_FRAMES, int(target))
+            pos = target
+        while pos < target and vid.grab():
+            pos += 1
+        if pos < target:
+            return
+        ok, frm = vid.read()
+        pos += 1
+        if ok:
+            yield cv2.cvtColor(prepare_frame(frm), cv2.COLOR_BGR2RGB)
+
+
+def read_keyframes(video, idx, fps):
+    import av
+
+    with av.open(video) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        stream.codec_context.skip_frame = 'NONKEY'
+        times, k = idx / fps, 0
+        for frame in container.decode(stream):
+            if k == len(times):
+                break
+            if frame.time is None or frame.time < times[k]:
+                continue
+            # One keyframe stands in for every sample time it passed
+            k = int(np.searchsorted(times, frame.time, side='right'))
+            yield prepare_frame(frame.to_ndarray(format='rgb24'))
 
 
-def get_frames(video, batch_size=10, target_fps=1):
+def get_frames(video, batch_size=10, target_fps=1, mode='auto', keyframes=False):
     vid = cv2.VideoCapture(video)
     total = int(vid.get(cv2.CAP_PROP_FRAME_COUNT))
     if total <= 0:
         return None
     fps = vid.get(cv2.CAP_PROP_FPS)
-    if target_fps > fps:
-        target_fps = fps
-    nfrm = int(total / fps * target_fps)
-    idx = np.linspace(0, total, nfrm, endpoint=False, dtype=int)
+    idx = sample_indices(total, fps, target_fps)
+
+    if keyframes:
+        vid.release()
+        frames = read_keyframes(video, idx, fps)
+    else:
+        seek_gap = {'grab': total, 'seek': 0, 'auto': max(int(fps * seek_seconds), 1)}[mode]
+        frames = read_frames(vid, idx, seek_gap)
+
     batch = []
-    for i in range(total):
-        ok = vid.grab()
-        if i not in idx:
-            continue
-        ok, frm = vid.retrieve()
-        if not ok:
-            continue
-        h, w = frm.shape[:2]
-        if w * h > 1920 * 1080:
-            scale = 1920 / max(w, h)
-            frm = cv2.resize(frm, (int(w * scale), int(h * scale)))
-        frm = cv2.cvtColor(frm, cv2.COLOR_BGR2RGB)
+    for frm in frames:
         batch.append(frm)
         if len(batch) == batch_size:
             yield batch
@@ -119,22 +240,118 @@ def fix_margins(faces, new_margin):
     return fixed
 
 
-def cluster(faces):
+def embed_faces(faces):
     if margin != 1.2:
         faces = fix_margins(faces, 1.2)
 
-    embeds = facenet.embedding(faces)
-
-    dbscan = DBSCAN(eps=0.35, metric='cosine', min_samples=scan_fps * 5)
-    labels = dbscan.fit_predict(embeds)
-
-    clusters = defaultdict(list)
-    for idx, label in enumerate(labels):
-        clusters[label].append(idx)
-    bad = {0: clusters.pop(-1, [])}
-    if len(clusters) == 0 and len(bad[0]) >= scan_fps * 5:
-        return bad
-    return clusters
+    with facenet as embedder:
+        return embedder.embedding(faces)
+
+
+class OnlineClusterer:
+    """Assigns each face embedding to the nearest running identity centroid as faces arrive.
+
+    Identities merge once their centroids come within merge_eps and split in two once a 2-means pass
+    over their members finds halves at least split_eps apart; merge_eps < eps < split_eps, so a split
+    is not undone by the next merge. Labels returned by add() are provisional, identities() has the final ones."""
+
+    def __init__(self, eps=0.35, merge_eps=0.25, split_eps=0.45, min_size=5):
+        self.eps = eps
+        self.merge_eps = merge_eps
+        self.split_eps = split_eps
+        self.min_size = min_size
+        self.sums = None
+        self.members = []
+        self.labels = []
+        # Each identity is checked for a split whenever its size doubles, which keeps the total work linear
+        self.next_split = []
+        self.embeddings = []
+        self.assignment = []
+        self.next_label = 0
+        self.merges = 0
+        self.splits = 0
+
+    def add(self, embedding):
+        e = np.asarray(embedding, dtype=np.float32)
+        e = e / (np.linalg.norm(e) + 1e-12)
+        index = len(self.embeddings)
+        self.embeddings.append(e)
+        self.assignment.append(None)
+        if self.members:
+            distances = 1 - self._centroids() @ e
+            k = int(np.argmin(distances))
+            if distances[k] <= self.eps:
+                self.sums[k] += e
+                self.members[k].append(index)
+                self.assignment[index] = self.labels[k]
+                self._split(self._merge(k))
+                return self.assignment[index]
+
+        self._new_identity([index], e.copy())
+        return self.assignment[index]
+
+    def identities(self):
+        return list(self.assignment)
+
+    def stats(self):
+        return {'identities': len(self.members), 'merges': self.merges, 'splits': self.splits}
+
+    def _centroids(self):
+        return self.sums / np.linalg.norm(self.sums, axis=1, keepdims=True)
+
+    def _new_identity(self, indices, total):
+        self.sums = total[np.newaxis] if self.sums is None else np.vstack([self.sums, total])
+        self.members.append(list(indices))
+        self.labels.append(self.next_label)
+        self.next_split.append(max(2 * len(indices), 2 * self.min_size))
+        for i in indices:
+            self.assignment[i] = self.next_label
+        self.next_label += 1
+
+    def _merge(self, k):
+        if len(self.members) > 1:
+            centroids = self._centroids()
+            distances = 1 - centroids @ centroids[k]
+            distances[k] = np.inf
+            other = int(np.argmin(distances))
+            if distances[other] <= self.merge_eps:
+                keep, drop = (k, other) if len(self.members[k]) >= len(self.members[other]) else (other, k)
+                self.sums[keep] += self.sums[drop]
+                for i in self.members[drop]:
+                    self.assignment[i] = self.labels[keep]
+                self.members[keep] += self.members[drop]
+                self.sums = np.delete(self.sums, drop, axis=0)
+                del self.members[drop], self.labels[drop], self.next_split[drop]
+                self.merges += 1
+                k = keep - (drop < keep)
+        return k
+
+    def _split(self, k):
+        members = self.members[k]
+        if len(members) < self.next_split[k]:
+            return
+        self.next_split[k] = 2 * len(members)
+
+        # Spherical 2-means seeded with the member furthest from the centroid and the one furthest from that
+        x = np.stack([self.embeddings[i] for i in members])
+        a = x[np.argmin(x @ self._centroids()[k])]
+        centres = np.stack([a, x[np.argmin(x @ a)]])
+        for _ in range(10):
+            side = np.argmax(x @ centres.T, axis=1)
+            if side.min() == side.max():
+                return
+            centres = np.stack([x[side == j].sum(axis=0) for j in (0, 1)])
+            centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+
+        sizes = np.bincount(side, minlength=2)
+        if sizes.min() < self.min_size or 1 - centres[0] @ centres[1] < self.split_eps:
+            return
+        moved = int(np.argmin(sizes))
+        self.members[k] = [i for i, j in zip(members, side) if j != moved]
+        self.sums[k] = x[side != moved].sum(axis=0)
+        self.next_split[k] = 2 * len(self.members[k])
+        self._new_identity([i for i, j in zip(members, side) if j == moved], x[side == moved].sum(axis=0))
+        self.splits += 1
 
 
 def id_strategy(pred, t=0.8):
@@ -172,75 +389,248 @@ preprocess = transforms.Compose([
 ])
 
 
-def scan(file):
-    frames = get_frames(file, batch_size, scan_fps)
-    faces, preds = [], []
+def detect_faces(batch):
+    with mtcnn as detector:
+        return detector.detect(batch)
 
-    for batch in frames:
-        results = mtcnn.detect(batch)
-        for i, res in enumerate(results):
-            if res is None:
-                continue
-            boxes, probs, lands = res
-            for j, box in enumerate(boxes):
-                if probs[j] > 0.98:
-                    face = crop_face(batch[i], box, margin)
-                    face = cv2.normalize(face, None, 0, 255, cv2.NORM_MINMAX)
-                    face = cv2.resize(face, face_size)
-                    faces.append(face)
 
-    if len(faces) == 0:
-        return None, []
+def face_crops(batch, results, ids=None):
+    # Crops are resized but not yet min-max normalised; their value range travels with them
+    for i, res in enumerate(results):
+        if res is None:
+            continue
+        boxes, probs, lands = res
+        for j, box in enumerate(boxes):
+            if probs[j] > 0.98:
+                face = crop_face(batch[i], box, margin)
+                value_range = crop_range(face)
+                face = cv2.resize(face, face_size)
+                yield face, value_range, i, box, ids[i][j] if ids is not None else None
 
-    with torch.no_grad():
-        n = batch_size
-        splitted_faces = int(np.ceil(len(faces) / n))
-
-        for i in range(splitted_faces):
-            faces_proc = []
-            for face in faces[i * n:(i + 1) * n]:
-                face = preprocess(face)
-                faces_proc.append(face)
-
-            x = torch.stack(faces_proc)
-            with autocast():
-                y = deepware(x.to(device))
-            preds.append(y)
 
-    preds = torch.sigmoid(torch.cat(preds, dim=0))[:, 0].cpu().numpy()
-    return list(preds), faces
+def extract_faces(batch, results):
+    crops = list(face_crops(batch, results))
+    if not crops:
+        return []
+    return list(minmax_uint8([crop[0] for crop in crops], [crop[1] for crop in crops]))
 
 
-def process(file):
-    try:
-        preds, faces = scan(file)
-        if preds is None:
-            return 0.5
+def identity_groups(records):
+    groups = defaultdict(list)
+    for record in records:
+        groups[record.identity].append(record.score)
+    bad = [score for scores in groups.values() if len(scores) < scan_fps * 5 for score in scores]
+    groups = {label: scores for label, scores in groups.items() if len(scores) >= scan_fps * 5}
+    if len(groups) == 0 and len(bad) >= scan_fps * 5:
+        return {0: bad}
+    return groups
+
 
-        clust = cluster(faces)
-        if len(clust) == 0:
-            return 0.5
+def preprocess_faces(faces, ranges=None):
+    return face_preprocessor(faces, ranges)
 
-        id_preds = defaultdict(list)
 
-        for label, indices in clust.items():
-            for idx in indices:
-                id_preds[label].append(preds[idx])
+def classify(x):
+    with torch.no_grad():
+        with deepware as ensemble:
+            return ensemble(x.to(device))
+
+
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.start = self.end = None
+        self.waiting = 0.0
+        self.occupancy = []
+
+    def report(self, maxsize):
+        busy = max((self.end or 0) - (self.start or 0) - self.waiting, 1e-3)
+        occupancy = np.mean(self.occupancy) if self.occupancy else 0.0
+        peak = max(self.occupancy, default=0)
+        return (f'{self.name:12s} items {self.items:6d}  busy {busy:7.2f}s  {self.items / busy:8.1f} items/s  '
+                f'input queue mean {occupancy:.1f}/{maxsize} max {peak}')
+
+
+class Pipeline:
+    _done = object()
+
+    def __init__(self, maxsize=4):
+        self.maxsize = maxsize
+        self.stages = []
+        self.stats = []
+        self._stop = threading.Event()
+        self._errors = []
+
+    def stage(self, name, fn):
+        self.stages.append((name, fn))
+        return self
+
+    def _take(self, q, stats):
+        while True:
+            start = time.perf_counter()
+            stats.occupancy.append(q.qsize())
+            item = self._get(q)
+            stats.waiting += time.perf_counter() - start
+            if item is self._done:
+                return
+            yield item
+
+    def _get(self, q):
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    return self._done
+
+    def _put(self, q, item, stats):
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        stats.waiting += time.perf_counter() - start
+
+    def _work(self, fn, source, sink, stats):
+        stats.start = time.perf_counter()
+        try:
+            for item in fn(source):
+                if self._stop.is_set():
+                    break
+                self._put(sink, item, stats)
+                stats.items += 1
+        except Exception as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            stats.end = time.perf_counter()
+            self._put(sink, self._done, stats)
+
+    def run(self, source):
+        threads = []
+        for name, fn in self.stages:
+            stats = StageStats(name)
+            sink = queue.Queue(self.maxsize)
+            inputs = source if not self.stats else self._take(source, stats)
+            threads.append(threading.Thread(target=self._work, args=(fn, inputs, sink, stats), daemon=True))
+            self.stats.append(stats)
+            source = sink
+
+        for thread in threads:
+            thread.start()
+        try:
+            yield from self._take(source, StageStats('output'))
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def report(self):
+        return [stats.report(self.maxsize) for stats in self.stats]
+
+
+FaceRecord = namedtuple('FaceRecord', ['frame', 'box', 'score', 'embedding', 'identity'])
+
 
-        preds = [id_strategy(preds) for preds in id_preds.values()]
-        if len(preds) == 0:
-            return 0.5
+def scan(file):
+    tracker, clusterer = None, OnlineClusterer(cluster_eps, merge_eps, split_eps, scan_fps * 5)
+    if track_every:
+        tracker = FaceTracker(lambda frames: [None if res is None else res[:2] for res in detect_faces(frames)],
+                              track_every)
+
+    def decode(frames):
+        yield from frames
+
+    def detect(batches):
+        offset = 0
+        for batch in batches:
+            results, ids = tracker.track(batch) if tracker is not None else (detect_faces(batch), None)
+            yield [(face, value_range, (offset + i, [float(v) for v in box], identity))
+                   for face, value_range, i, box, identity in face_crops(batch, results, ids)]
+            offset += len(batch)
+
+    def prepare(found_batches):
+        pending = []
+        for found in found_batches:
+            pending.extend(found)
+            while len(pending) >= batch_size:
+                chunk, pending = pending[:batch_size], pending[batch_size:]
+                yield preprocess_faces([face for face, _, _ in chunk], [r for _, r, _ in chunk]), chunk
+        if pending:
+            yield preprocess_faces([face for face, _, _ in pending], [r for _, r, _ in pending]), pending
+
+    def infer(tensors):
+        for x, chunk in tensors:
+            yield torch.sigmoid(classify(x).float())[:, 0].cpu().numpy(), chunk
+
+    def embed(scored):
+        # Crops are released here; only the compact records outlive the batch
+        for scores, chunk in scored:
+            if tracker is None:
+                embeddings = embed_faces(list(minmax_uint8([face for face, _, _ in chunk], [r for _, r, _ in chunk])))
+                identities = [clusterer.add(embedding) for embedding in embeddings]
+            else:
+                embeddings = [None] * len(chunk)
+                identities = [identity for _, _, (_, _, identity) in chunk]
+            yield [FaceRecord(frame, box, float(score), embedding, identity)
+                   for (_, _, (frame, box, _)), score, embedding, identity
+                   in zip(chunk, scores, embeddings, identities)]
+
+    pipeline = Pipeline(queue_size).stage('decode', decode).stage('detect', detect) \
+        .stage('preprocess', prepare).stage('classify', infer).stage('embed', embed)
+    records = [record for batch in pipeline.run(get_frames(file, batch_size, scan_fps, sample_mode, keyframes_only))
+               for record in batch]
+
+    if report_stats:
+        print('\n'.join(pipeline.report()), file=sys.stderr)
+        if tracker is not None:
+            print(f'tracker {tracker.stats()}', file=sys.stderr)
+        else:
+            print(f'clusterer {clusterer.stats()}', file=sys.stderr)
+        with deepware as ensemble:
+            if ensemble.bounds is not None:
+                print(f'cascade depth fractions {ensemble.depth_stats()}', file=sys.stderr)
+
+    # Identities merged or split after a face was assigned are relabelled with the final grouping
+    if tracker is None:
+        records = [record._replace(identity=identity) for record, identity in zip(records, clusterer.identities())]
+    return records
+
+
+def analyze(file):
+    result = {'score': 0.5, 'faces': 0, 'clusters': 0}
+    records = scan(file)
+    if len(records) == 0:
+        return result
+    result['faces'] = len(records)
+
+    groups = identity_groups(records)
+    result['clusters'] = len(groups)
+    preds = [id_strategy(scores) for scores in groups.values()]
+    if len(preds) == 0:
+        return result
+
+    score = strategy(preds)
+    result['score'] = float(np.clip(score, 0.01, 0.99))
+    return result
 
-        score = strategy(preds)
-        return np.clip(score, 0.01, 0.99)
 
+def process(file):
+    try:
+        return analyze(file)['score']
     except Exception as e:
         print(e, file, file=sys.stderr)
         return 0.5
 
 
 def init(models_dir, cfg_file, dev):
-    global device, mtcnn, facenet, deepware, margin, face_size
+    global device, mtcnn, facenet, deepware, margin, face_size, face_preprocessor, track_every
+    global sample_mode, seek_seconds, keyframes_only
 
     # Load the configuration file
     cfg = json.loads(cfg_file)
@@ -248,27 +638,241 @@ def init(models_dir, cfg_file, dev):
     arch = cfg['arch']
     margin = cfg['margin']
     face_size = (cfg['size'], cfg['size'])
+    face_preprocessor = FacePreprocessor(face_size, IMAGENET_MEAN, IMAGENET_STD, minmax=True, device=dev)
+    track_every = cfg.get('track_every', track_every)
+    sample_mode = cfg.get('sample_mode', sample_mode)
+    seek_seconds = cfg.get('seek_seconds', seek_seconds)
+    keyframes_only = cfg.get('keyframes_only', keyframes_only)
 
     device = dev
-    mtcnn = MTCNN(device)
-    facenet = FaceNet(device)
 
     if os.path.isdir(models_dir):
         model_paths = glob.glob('%s/*.pt' % models_dir)
     else:
         model_paths = [models_dir]
 
-    model_list = []
     assert len(model_paths) >= 1
 
-    for model_path in model_paths:
-        b3_model = EffNet(arch)
-        checkpoint = torch.load(model_path, map_location="cpu")
-        b3_model.load_state_dict(checkpoint)
-        del checkpoint
-        model_list.append(b3_model)
+    if not registry.is_registered('dface_mtcnn'):
+        registry.register('dface_mtcnn', lambda: MTCNN(dev))
+        registry.register('facenet', lambda: FaceNet(dev))
+        engine = cfg.get('engine', 'torch')
+        precision = cfg.get('precision') or ('fp16' if torch.device(dev).type == 'cuda' and engine != 'onnxruntime' else 'fp32')
+        calibration = lambda: ensemble_calibration(cfg.get('calibration', []))
+        registry.register('deepware', lambda: load_ensemble(model_paths, arch, dev, cfg.get('cascade'),
+                                                            precision, calibration, engine),
+                          lambda model: warmup_ensemble(model, face_size, dev))
+
+    mtcnn = registry.get('dface_mtcnn')
+    facenet = registry.get('facenet')
+    deepware = registry.get('deepware')
+    if report_stats:
+        boot = boot_report()
+        print(f"Models ready {boot['time_to_ready_s']}s after process start, RSS {boot['rss_mb']} MB", file=sys.stderr)
+
+
+def cascade_order(model_paths, names=None):
+    names = [os.path.basename(name) for name in names or []]
+    basenames = [os.path.basename(path) for path in model_paths]
+    order = [basenames.index(name) for name in names if name in basenames]
+    return order + [i for i in range(len(model_paths)) if i not in order]
+
+
+def load_ensemble(model_paths, arch, dev, cascade=None, precision='fp32', calibration=None, engine='torch'):
+    model_paths = sorted(model_paths)
+    if engine == 'onnxruntime':
+        if precision != 'fp32':
+            raise ValueError(f'The onnxruntime engine runs fp32 exports, not {precision}')
+        model_list = [OnnxModel(onnx_path(model_path), dev) for model_path in model_paths]
+    elif engine == 'torchscript':
+        example = torch.zeros(1, 3, *face_size, device=dev)
+        model_list = [traced_module(lambda path=model_path: load_ensemble([path], arch, dev, None, precision,
+                                                                          calibration).models[0],
+                                    model_path, f'{arch}-{precision}-{torch.device(dev).type}', example)
+                      for model_path in model_paths]
+    else:
+        # Weights stay memory-mapped on CPU, so scan workers share the file's pages instead of each holding a copy
+        model_list = [load_module(lambda: EffNet(arch), model_path, device=dev, weights_only=False)
+                      for model_path in model_paths]
+
+        if precision == 'int8_static' and callable(calibration):
+            calibration = calibration()
+        model_list = [apply_precision(model, precision, dev, calibration) for model in model_list]
+
+    if cascade:
+        return Ensemble(model_list, cascade_order(model_paths, cascade.get('order')),
+                        tuple(cascade.get('bounds', (0.05, 0.95)))).eval()
+    return Ensemble(model_list).eval()
+
+
+def ensemble_calibration(videos, limit=128):
+    faces = []
+    for video in videos:
+        for batch in get_frames(video, batch_size, scan_fps, sample_mode, keyframes_only):
+            faces.extend(extract_faces(batch, detect_faces(batch)))
+            if len(faces) >= limit:
+                break
+        if len(faces) >= limit:
+            break
+    faces = faces[:limit]
+    return [preprocess_faces(faces[i:i + batch_size]) for i in range(0, len(faces), batch_size)]
+
+
+def warmup_ensemble(model, size, dev):
+    with torch.no_grad():
+        model(torch.zeros(1, 3, *size, device=model_device(model)))
+
+
+def cascade_report(videos, bounds, order=None):
+    # Runs every member on the validation faces once, then replays the cascade on the stored logits
+    logits = []
+    for video in tqdm(videos):
+        faces = [face for batch in get_frames(video, batch_size, scan_fps, sample_mode, keyframes_only)
+                 for face in extract_faces(batch, detect_faces(batch))]
+        for i in range(0, len(faces), batch_size):
+            x = preprocess_faces(faces[i:i + batch_size]).to(device)
+            with torch.no_grad(), deepware as ensemble:
+                logits.append(ensemble.member_outputs(x)[..., 0].float().cpu().numpy())
+    if not logits:
+        return {'faces': 0}
+
+    logits = np.concatenate(logits, axis=1)
+    with deepware as ensemble:
+        order = order if order is not None else ensemble.order
+    full = 1 / (1 + np.exp(-logits.mean(axis=0)))
+    cascaded, depths = simulate_cascade(logits, order, bounds)
+    drift = np.abs(1 / (1 + np.exp(-cascaded)) - full)
+    return {
+        'faces': int(logits.shape[1]),
+        'bounds': list(bounds),
+        'depth_fractions': {depth: round(float(np.mean(depths == depth)), 4) for depth in range(1, len(order) + 1)},
+        'mean_members_run': round(float(depths.mean()), 3),
+        'drift_mean': float(drift.mean()),
+        'drift_p95': float(np.percentile(drift, 95)),
+        'drift_max': float(drift.max()),
+        'label_flips': int(np.sum((full > 0.5) != (cascaded > 0)))
+    }
+
+
+def clustering_report(videos):
+    from sklearn.metrics import adjusted_rand_score
 
-    deepware = Ensemble(model_list).eval().to(device)
+    report = []
+    for video in tqdm(videos):
+        records = scan(video)
+        if len(records) == 0 or records[0].embedding is None:
+            continue
+        online = [record.identity for record in records]
+        sizes = defaultdict(int)
+        for label in online:
+            sizes[label] += 1
+        # Identities too small to count are DBSCAN noise
+        online = [label if sizes[label] >= scan_fps * 5 else -1 for label in online]
+
+        # Whole-video DBSCAN is the reference grouping the online clusterer is measured against
+        start = time.perf_counter()
+        dbscan = DBSCAN(eps=0.35, metric='cosine', min_samples=scan_fps * 5).fit_predict(
+            np.stack([record.embedding for record in records]))
+        report.append({
+            'video': video,
+            'faces': len(records),
+            'dbscan_identities': len(set(dbscan) - {-1}),
+            'online_identities': len(set(online) - {-1}),
+            'adjusted_rand_index': round(float(adjusted_rand_score(dbscan, online)), 4),
+            'dbscan_ms': round((time.perf_counter() - start) * 1000, 2)
+        })
+    return report
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+
+
+def collect_videos(inputs, manifest=None):
+    videos = []
+    if manifest:
+        with open(manifest) as f:
+            inputs = list(inputs) + [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    for entry in inputs:
+        if os.path.isdir(entry):
+            for root, _, files in os.walk(entry):
+                videos.extend(os.path.join(root, name) for name in sorted(files)
+                              if name.lower().endswith(VIDEO_EXTENSIONS))
+        elif os.path.isfile(entry):
+            videos.append(entry)
+        else:
+            videos.extend(sorted(glob.glob(entry, recursive=True)))
+    return list(dict.fromkeys(os.path.abspath(video) for video in videos))
+
+
+def completed_videos(output):
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output) as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A crash can leave a partial last line; that video is simply scanned again
+                continue
+            # Failures may be transient (OOM, decode errors), so they are retried; the newest line wins
+            if 'video' in result and 'error' not in result:
+                done.add(result['video'])
+    return done
+
+
+def init_worker(models_dir, cfg_file, dev, threads):
+    global report_stats
+    report_stats = False
+    if threads:
+        torch.set_num_threads(threads)
+    init(models_dir, cfg_file, dev)
+
+
+def scan_entry(video):
+    start_time = time.time()
+    try:
+        result = analyze(video)
+    except Exception as e:
+        result = {'score': 0.5, 'faces': 0, 'clusters': 0, 'error': str(e) or type(e).__name__}
+    result['status'] = 'Real' if result['score'] <= 0.5 else 'Deepfake'
+    return {'video': video, **result, 'time': round(time.time() - start_time, 3)}
+
+
+def run_batch(videos, output, models_dir, cfg_file, dev, workers=1, threads=0):
+    done = completed_videos(output)
+    pending = [video for video in videos if video not in done]
+    print(f'{len(videos)} videos, {len(videos) - len(pending)} already done, {len(pending)} to scan', file=sys.stderr)
+
+    with open(output, 'a+') as out:
+        # Terminate a partial line left by a crash so new results start on their own line
+        if out.tell() > 0:
+            out.seek(out.tell() - 1)
+            if out.read(1) != '\n':
+                out.write('\n')
+
+        def write(result):
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+
+        if workers <= 1:
+            init_worker(models_dir, cfg_file, dev, threads)
+            for video in tqdm(pending):
+                write(scan_entry(video))
+            return
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=init_worker,
+                                 initargs=(models_dir, cfg_file, dev, threads)) as pool:
+            videos = iter(pending)
+            running = {pool.submit(scan_entry, video) for video in islice(videos, workers * 2)}
+            with tqdm(total=len(pending)) as progress:
+                while running:
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        write(future.result())
+                        progress.update()
+                    running |= {pool.submit(scan_entry, video) for video in islice(videos, len(finished))}
 
 
 def main(models_dir='weights/deepware.pt', cfg_file="""{
@@ -282,20 +886,88 @@ def main(models_dir='weights/deepware.pt', cfg_file="""{
         "strong_transform": 1
     }
 }""", dev='cpu'):
-    # Initialize the model
-    init(models_dir, cfg_file, dev)
-    
-    # Get the video path from command line arguments
-    if len(sys.argv) < 2:
-        print("Usage: python scan.py path/video.mp4")
+    parser = argparse.ArgumentParser(description='Score videos for deepfakes')
+    parser.add_argument('inputs', nargs='*', help='video files, directories or glob patterns')
+    parser.add_argument('--manifest', help='text file with one video path per line')
+    parser.add_argument('--output', help='JSONL results file; enables batch mode and resumes from it, retrying failed videos')
+    parser.add_argument('--workers', type=int, default=1, help='processes used in batch mode')
+    parser.add_argument('--threads', type=int, default=0, help='torch threads per worker (0 keeps the default)')
+    parser.add_argument('--models', default=models_dir)
+    parser.add_argument('--config', help='JSON model config file')
+    parser.add_argument('--device', default=dev)
+    parser.add_argument('--precision', choices=TORCH_PRECISIONS, help='ensemble precision (default fp16 on CUDA, fp32 on CPU)')
+    parser.add_argument('--calibrate', nargs='+', default=[], help='videos used to calibrate int8_static')
+    parser.add_argument('--engine', choices=['torch', 'torchscript', 'onnxruntime'],
+                        help='run the .pt checkpoints, cached traces of them or their ONNX exports')
+    parser.add_argument('--sample-mode', choices=SAMPLE_MODES,
+                        help="frame sampling: sequential 'grab', 'seek' to every sample, or 'auto' (default)")
+    parser.add_argument('--seek-seconds', type=float, help="'auto' seeks when samples are further apart than this")
+    parser.add_argument('--keyframes-only', action='store_true', help='decode only keyframes (PyAV), nearest to each sample')
+    parser.add_argument('--track-every', type=int, help='detect faces every K sampled frames and track in between')
+    parser.add_argument('--cascade', action='store_true', help='stop evaluating ensemble members once confident')
+    parser.add_argument('--cascade-bounds', type=float, nargs=2, default=[0.05, 0.95], metavar=('LOW', 'HIGH'))
+    parser.add_argument('--cascade-order', nargs='+', help='checkpoint file names in evaluation order')
+    parser.add_argument('--cascade-report', action='store_true',
+                        help='measure cascade depth and drift from the full ensemble on the given videos')
+    parser.add_argument('--cluster-report', action='store_true',
+                        help='compare online identity clustering with whole-video DBSCAN on the given videos')
+    args = parser.parse_args()
+
+    if args.config:
+        with open(args.config) as f:
+            cfg_file = f.read()
+
+    cfg = json.loads(cfg_file)
+    if args.cascade:
+        cfg['cascade'] = {'bounds': args.cascade_bounds, 'order': args.cascade_order}
+    if args.precision:
+        cfg['precision'] = args.precision
+    if args.track_every is not None:
+        cfg['track_every'] = args.track_every
+    if args.engine:
+        cfg['engine'] = args.engine
+    if args.sample_mode:
+        cfg['sample_mode'] = args.sample_mode
+    if args.seek_seconds is not None:
+        cfg['seek_seconds'] = args.seek_seconds
+    if args.keyframes_only:
+        cfg['keyframes_only'] = True
+    if args.calibrate:
+        cfg['calibration'] = collect_videos(args.calibrate)
+    cfg_file = json.dumps(cfg)
+
+    if args.cascade_report:
+        init(args.models, cfg_file, args.device)
+        model_paths = glob.glob('%s/*.pt' % args.models) if os.path.isdir(args.models) else [args.models]
+        order = cascade_order(sorted(model_paths), args.cascade_order)
+        report = cascade_report(collect_videos(args.inputs, args.manifest), args.cascade_bounds, order)
+        print(json.dumps(report, indent=2))
         return
-    
-    video = sys.argv[1]
 
-    if not os.path.isfile(video):
-        print("Invalid video path. Please enter a valid one.")
+    if args.cluster_report:
+        init(args.models, cfg_file, args.device)
+        print(json.dumps(clustering_report(collect_videos(args.inputs, args.manifest)), indent=2))
         return
 
+    if not args.inputs and not args.manifest:
+        print("Usage: python scan.py path/video.mp4 | directory | 'glob/*.mp4'")
+        return
+
+    # Directories, globs, manifests and several inputs all go through the resumable batch mode
+    if args.output or args.manifest or len(args.inputs) != 1 or not os.path.isfile(args.inputs[0]):
+        videos = collect_videos(args.inputs, args.manifest)
+        if not videos:
+            print("No videos found. Please enter a valid path, directory or glob pattern.")
+            return
+        run_batch(videos, args.output or 'results.jsonl', args.models, cfg_file, args.device,
+                  args.workers, args.threads)
+        return
+
+    video = args.inputs[0]
+
+    # Initialize the model
+    init(args.models, cfg_file, args.device)
+
     # Process the video and compute score
     start_time = time.time()
     score = process(video)
@@ -1,34 +1,124 @@
+import json
+import base64
 import sqlite3
-from flask import Flask, jsonify
+from flask import Flask, request, jsonify
 from flask_cors import CORS
+from db_migrations import migrate
+from stats_rollups import query_stats
 
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})  
+CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}}, expose_headers=['X-Next-Cursor'])
 
+DATABASE = 'predictions.db'
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+
+COLUMNS = ['id', 'date', 'time', 'platform', 'status', 'confidence', 'media_format']
+FILTERS = ['platform', 'status', 'media_format']
+
+SORTS = {
+    # Table order, what the endpoint returned before pagination existed
+    'id': (['id'], 'ASC'),
+    'newest': (['date', 'time', 'id'], 'DESC'),
+    'oldest': (['date', 'time', 'id'], 'ASC'),
+    'confidence_desc': (['confidence', 'id'], 'DESC'),
+    'confidence_asc': (['confidence', 'id'], 'ASC'),
+}
+
+
+def connect():
+    conn = sqlite3.connect(DATABASE)
+    conn.execute('PRAGMA busy_timeout=5000')
+    return conn
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, size):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def query_predictions(filters, sort='newest', limit=DEFAULT_LIMIT, cursor=None):
+    # limit=None returns every matching row without a cursor
+    if sort not in SORTS:
+        raise ValueError(f'Unknown sort: {sort}')
+    keys, direction = SORTS[sort]
+
+    clauses, params = [], []
+    if filters.get('date_from'):
+        clauses.append('date >= ?')
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        clauses.append('date <= ?')
+        params.append(filters['date_to'])
+    for name in FILTERS:
+        if filters.get(name):
+            clauses.append(f'{name} = ?')
+            params.append(filters[name])
+    if cursor:
+        comparison = '<' if direction == 'DESC' else '>'
+        clauses.append(f"({', '.join(keys)}) {comparison} ({', '.join('?' * len(keys))})")
+        params.extend(decode_cursor(cursor, len(keys)))
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    order = ', '.join(f'{key} {direction}' for key in keys)
+    sql = f"SELECT {', '.join(COLUMNS)} FROM predictions {where} ORDER BY {order}"
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit + 1)
+
+    conn = connect()
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+    records = [dict(zip(COLUMNS, row)) for row in rows[:limit]]
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        next_cursor = encode_cursor([records[-1][key] for key in keys])
+    return records, next_cursor
 
-def get_all_predictions():
-    conn = sqlite3.connect('predictions.db')  
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM predictions')
-    records = cursor.fetchall()
-    conn.close()
-    return records
 
 @app.route('/api/predictions', methods=['GET'])
 def get_predictions():
-    records = get_all_predictions()
-    response = []
-    for row in records:
-        response.append({
-            'id': row[0],
-            'date': row[1],
-            'time': row[2],
-            'platform': row[3],
-            'status': row[4],
-            'confidence': row[5],
-            'media_format': row[6]  
-        })
-    return jsonify(response)
+    try:
+        # Pagination is opt-in: existing consumers that pass neither limit nor cursor still get every row,
+        # in table order
+        limit, sort = None, 'id'
+        if 'limit' in request.args or 'cursor' in request.args:
+            limit = min(max(int(request.args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+            sort = 'newest'
+        records, next_cursor = query_predictions(
+            request.args,
+            sort=request.args.get('sort', sort),
+            limit=limit,
+            cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    response = jsonify(records)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    conn = connect()
+    try:
+        return jsonify(query_stats(conn, request.args))
+    finally:
+        conn.close()
 
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)  
+    migrate(DATABASE)
+    app.run(debug=True, port=5001)
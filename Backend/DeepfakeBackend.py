@@ -1,40 +1,69 @@
 import os
 import json
 import hashlib
-import random
+import time
 import logging
-import numpy as np
-import librosa
 import torch
-import cv2
-import matplotlib
-import sqlite3
-from flask import Flask, request, jsonify
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from PIL import Image
 from collections import Counter
-from facenet_pytorch import MTCNN, InceptionResnetV1
-from tensorflow.keras.models import load_model
-import matplotlib.pyplot as plt
 from google_img_source_search import ReverseImageSearcher
 from datetime import datetime
 from werkzeug.utils import secure_filename
-
-matplotlib.use('Agg')  
+from model_registry import registry, boot_report, register_face_models, register_audio_models, INCEPTION_CHECKPOINT, AUDIO_CLASSIFIER
+from inference_batcher import InferenceBatcher
+from prediction_cache import PredictionCache, checkpoint_version
+from ingest import IngestedFile, ingest_upload, promote
+from jobs import JobManager, JobQueueFull
+from prediction_recorder import PredictionRecorder
+from db_migrations import migrate
+from stats_rollups import apply_rows
+from video_frames import sample_video_frames
+from audio_scoring import score_audio, score_audio_batch, feature_pool
+from audio_features import AudioFrontend, DEFAULT_RESAMPLER
+from feature_cache import FeatureCache
+from face_tracker import FaceTracker
+from face_preprocessing import FacePreprocessor
 
 logging.basicConfig(level=logging.DEBUG)
 
 app = Flask(__name__)
-CORS(app, resources={r"/upload": {"origins": ["http://localhost:3000", "http://localhost:5173"]}})
+CORS(app, resources={r"/(upload|jobs.*|audio/batch)": {"origins": ["http://localhost:3000", "http://localhost:5173"]}})
+
+# Feature workers are forked here, before any model or background thread exists in this process
+app.config['AUDIO_BATCH_WORKERS'] = None
+audio_pool = feature_pool(app.config['AUDIO_BATCH_WORKERS'], start=True)
+audio_pool_lock = threading.Lock()
 
 DEVICE = 'cuda:0' if torch.cuda.is_available() else 'cpu'
 
-mtcnn = MTCNN(select_largest=False, post_process=False, device=DEVICE).to(DEVICE).eval()
-model = InceptionResnetV1(pretrained='vggface2', classify=True, num_classes=1, device=DEVICE)
-checkpoint_path = os.path.join(os.path.dirname(__file__), 'resnetinceptionvit.pth')
-checkpoint = torch.load(checkpoint_path, map_location=torch.device('cpu'),weights_only=True)
-model.load_state_dict(checkpoint['model_state_dict'])
-model.to(DEVICE).eval()
+# INCEPTION_PRECISION: fp32, fp16 (CUDA only), bf16 or int8_static
+# AUDIO_PRECISION: fp32, fp16, bf16, int8_dynamic or int8_static
+# int8_static calibrates on the files in CALIBRATION_FOLDER
+app.config['INCEPTION_PRECISION'] = 'fp32'
+app.config['AUDIO_PRECISION'] = 'fp32'
+app.config['CALIBRATION_FOLDER'] = None
+# 'torch' / 'keras' run the checkpoints eagerly, 'torchscript' caches a trace of the torch model on first start,
+# 'onnxruntime' runs the exports from Backend/export_onnx.py
+app.config['INCEPTION_ENGINE'] = 'torch'
+app.config['AUDIO_ENGINE'] = 'keras'
+
+register_face_models(DEVICE, app.config['INCEPTION_PRECISION'], app.config['CALIBRATION_FOLDER'],
+                     app.config['INCEPTION_ENGINE'])
+register_audio_models(app.config['AUDIO_PRECISION'], app.config['CALIBRATION_FOLDER'], app.config['AUDIO_ENGINE'])
+registry.preload()
+BOOT_REPORT = boot_report()
+logging.info(f"Models ready {BOOT_REPORT['time_to_ready_s']}s after process start, RSS {BOOT_REPORT['rss_mb']} MB")
+
+mtcnn = registry.get('mtcnn')
+model = registry.get('inception')
+audio_model = registry.get('audio_classifier')
 
 UPLOAD_FOLDER = 'uploads'
 MEDIA_FOLDER = 'media'  
@@ -42,25 +71,44 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(MEDIA_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MEDIA_FOLDER'] = MEDIA_FOLDER
+app.config['BATCH_MAX_SIZE'] = 16
+app.config['BATCH_MAX_WAIT_MS'] = 10
+app.config['BATCH_TIMEOUT_S'] = 30
+app.config['JOB_WORKERS'] = 2
+app.config['JOB_MAX_PENDING'] = 64
+app.config['DB_FLUSH_ROWS'] = 100
+app.config['DB_FLUSH_INTERVAL_MS'] = 200
+app.config['AUDIO_DECODER'] = 'soundfile'
+# The audio model was trained on librosa.load's default resampling
+app.config['AUDIO_RESAMPLER'] = DEFAULT_RESAMPLER
+app.config['FEATURE_CACHE_FOLDER'] = 'feature_cache'
+app.config['FEATURE_CACHE_MAX_BYTES'] = 2 * 1024 ** 3
+app.config['FEATURE_CACHE_MAX_AGE'] = 7 * 24 * 3600
+app.config['VIDEO_TRACK_EVERY'] = 0
 
 rev_img_searcher = ReverseImageSearcher()
 
 DATABASE = 'predictions.db'
 
+MODEL_VERSIONS = {
+    'image': f"{checkpoint_version(INCEPTION_CHECKPOINT)}-{app.config['INCEPTION_PRECISION']}-{app.config['INCEPTION_ENGINE']}",
+    'video': f"{checkpoint_version(INCEPTION_CHECKPOINT)}-{app.config['INCEPTION_PRECISION']}-{app.config['INCEPTION_ENGINE']}",
+    'audio': f"{checkpoint_version(AUDIO_CLASSIFIER)}-windowed-{app.config['AUDIO_RESAMPLER']}-{app.config['AUDIO_PRECISION']}-{app.config['AUDIO_ENGINE']}"
+}
+
+prediction_cache = PredictionCache('prediction_cache.db')
+for modality, version in MODEL_VERSIONS.items():
+    prediction_cache.invalidate(modality, version)
+
 def init_db():
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('''CREATE TABLE IF NOT EXISTS predictions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT,
-        time TEXT,
-        platform TEXT,
-        status TEXT,
-        confidence REAL,
-        media_format TEXT 
-    )''')
-    conn.commit()
-    conn.close()
+    migrate(DATABASE)
+
+# Migrations are idempotent, so every process (WSGI workers, the debug reloader) applies them on import
+init_db()
+
+recorder = PredictionRecorder(DATABASE, flush_rows=app.config['DB_FLUSH_ROWS'],
+                              flush_interval_ms=app.config['DB_FLUSH_INTERVAL_MS'], on_write=apply_rows)
+atexit.register(recorder.close)
 
 def save_to_db(status, confidence, media_format):
     now = datetime.now()
@@ -70,83 +118,103 @@ def save_to_db(status, confidence, media_format):
 
     confidence = round(confidence, 2)
 
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    cursor.execute('''INSERT INTO predictions (date, time, platform, status, confidence, media_format)
-                      VALUES (?, ?, ?, ?, ?, ?)''', (date, time, platform, status, confidence, media_format))
-    conn.commit()
-    conn.close()
+    recorder.record((date, time, platform, status, confidence, media_format))
 
-def format_frames(frame, output_size):
-    return cv2.resize(frame, output_size)
+face_preprocessor = FacePreprocessor((160, 160), device=DEVICE)
 
-def frames_from_video_file(video_path, n_frames, output_size=(224, 224), frame_step=15):
-    result = []
-    src = cv2.VideoCapture(video_path)
-    video_length = int(src.get(cv2.CAP_PROP_FRAME_COUNT))
-    need_length = 1 + (n_frames - 1) * frame_step
+def classify_faces(faces):
+    batch = face_preprocessor(faces)
+    with torch.no_grad(), model as classifier:
+        output = torch.sigmoid(classifier(batch).squeeze(1))
+    return output.cpu().tolist()
 
-    start = 0 if need_length > video_length else random.randint(0, video_length - need_length)
-    src.set(cv2.CAP_PROP_POS_FRAMES, start)
-
-    ret, frame = src.read()
-    if not ret:
-        return np.zeros((n_frames, *output_size, 3), dtype=np.uint8)
-
-    result.append(format_frames(frame, output_size))
-
-    for _ in range(n_frames - 1):
-        for _ in range(frame_step):
-            ret, frame = src.read()
-        result.append(format_frames(frame, output_size) if ret else np.zeros_like(result[0]))
-
-    src.release()
-    return np.array(result)
+face_batcher = InferenceBatcher(classify_faces, max_batch_size=app.config['BATCH_MAX_SIZE'],
+                                max_wait_ms=app.config['BATCH_MAX_WAIT_MS'], name='face_batcher')
 
 def pred(image_path: str):
     img = Image.open(image_path).convert('RGB')
-    face = mtcnn(img)
+    with mtcnn as detector:
+        face = detector(img)
     if face is None:
         return "no_face_detected", 0  
 
-    face = face.unsqueeze(0).to(DEVICE).float() / 255.0
-    with torch.no_grad():
-        output = torch.sigmoid(model(face).squeeze(0))
-        confidence = output.item()
-        status = "real" if confidence < 0.5 else "fake"
-        return status, confidence
-
-def predictFake(path):
-    m, _ = librosa.load(path, sr=16000)
-    mfccs = librosa.feature.mfcc(y=m, sr=16000, n_mfcc=40)
-    max_length = 500
+    confidence = face_batcher(face, timeout=app.config['BATCH_TIMEOUT_S'])
+    status = "real" if confidence < 0.5 else "fake"
+    return status, confidence
 
-    if mfccs.shape[1] < max_length:
-        mfccs = np.pad(mfccs, ((0, 0), (0, max_length - mfccs.shape[1])), mode='constant')
+audio_frontend = AudioFrontend(decoder=app.config['AUDIO_DECODER'], resampler=app.config['AUDIO_RESAMPLER'])
+feature_cache = FeatureCache(app.config['FEATURE_CACHE_FOLDER'], app.config['FEATURE_CACHE_MAX_BYTES'],
+                             app.config['FEATURE_CACHE_MAX_AGE'])
+
+def predictFake(path, content_hash=None):
+    result = score_audio(path, audio_model, content_hash, frontend=audio_frontend, cache=feature_cache)
+    details = {name: result[name] for name in ('max_confidence', 'fake_windows', 'timeline')}
+    return result['prediction'], result['confidence'], details
+
+def detect_boxes(frames):
+    with mtcnn as detector:
+        boxes, probs = detector.detect(frames)
+    return [None if b is None else (b, p) for b, p in zip(boxes, probs)]
+
+def track_faces(frames):
+    tracker = FaceTracker(detect_boxes, app.config['VIDEO_TRACK_EVERY'])
+    results, _ = tracker.track(list(frames))
+    boxes = [None if res is None else res[0][np.argsort(-res[1])] for res in results]
+    with mtcnn as detector:
+        return detector.extract(frames, boxes, None)
+
+def pred_frames(frames):
+    if app.config['VIDEO_TRACK_EVERY']:
+        faces = track_faces(frames)
     else:
-        mfccs = mfccs[:, :max_length]
-
-    model_path = os.path.join(os.path.dirname(__file__), 'audio_classifier.h5')
-    model = load_model(model_path)
-    output = model.predict(mfccs.reshape(-1, 40, 500))
-    confidence = output[0][0]
-    status = "fake" if confidence > 0.5 else "real"
-    return status, confidence
+        with mtcnn as detector:
+            faces = detector(frames)
+
+    detected = [face for face in faces if face is not None]
+    confidences = iter(classify_faces(detected) if detected else [])
+
+    results = []
+    for face in faces:
+        if face is None:
+            results.append(("no_face_detected", 0))
+            continue
+        confidence = next(confidences)
+        results.append(("real" if confidence < 0.5 else "fake", confidence))
+    return results
+
+def pred_video(path):
+    frames = sample_video_frames(path)
+    predictions = []
+    confidences = []
 
-def save_images(path):
-    paths = []
-    for i in range(3):
-        image_3d = frames_from_video_file(path, 3)[i]
-        if image_3d.shape[2] == 4:
-            image_3d = image_3d[:, :, :3]
-        plt.figure(figsize=(1, 1))
-        plt.imshow(image_3d)
-        plt.axis('off')
-        save_path = os.path.join(app.config['UPLOAD_FOLDER'], f"image{i}.jpg")
-        paths.append(save_path)
-        plt.savefig(save_path, bbox_inches='tight', pad_inches=0)
-        plt.close()
-    return paths
+    try:
+        for i, (status, confidence) in enumerate(pred_frames(frames)):
+            predictions.append(status)
+            confidences.append(confidence)
+            logging.info(f'Frame Prediction: {status} for frame {i}, Confidence: {confidence}')
+    except Exception as e:
+        predictions = ["error"] * len(frames)
+        confidences = [0] * len(frames)
+        logging.error(f'Error in frame prediction: {str(e)}')
+
+    final_prediction = find_mode(predictions)
+    final_confidence = sum(confidences) / len(confidences)
+    return final_prediction, final_confidence
+
+def cached_prediction(file_hash, media_format, predict, path):
+    version = MODEL_VERSIONS[media_format]
+    cached = prediction_cache.get(file_hash, media_format, version)
+    if cached is not None:
+        logging.info(f'Cache hit for {media_format} {file_hash[:12]}')
+        return cached['prediction'], cached['confidence'], cached.get('details', {})
+
+    result = predict(path)
+    status, confidence = result[:2]
+    details = result[2] if len(result) > 2 else {}
+    if status != "error":
+        prediction_cache.put(file_hash, media_format, version,
+                             {'prediction': status, 'confidence': confidence, 'details': details})
+    return status, confidence, details
 
 def find_mode(arr):
     counts = Counter(arr)
@@ -167,34 +235,37 @@ def reverse_image_search(image_path):
 def hash_file(file_path):
     sha256_hash = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
+        for byte_block in iter(lambda: f.read(1024 * 1024), b""):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
-def prepare_metadata(file_path, owner):
+def prepare_metadata(file_path, owner, file_hash=None, extra=None):
     filename = os.path.basename(file_path)
     timestamp = datetime.now().isoformat()
-    file_hash = hash_file(file_path)
     metadata = {
         "filename": filename,
         "timestamp": timestamp,
-        "file_hash": file_hash,
+        "file_hash": file_hash or hash_file(file_path),
         "owner": owner
     }
+    metadata.update(extra or {})
     metadata_json = json.dumps(metadata, indent=4)
     return metadata_json
 
-def save_media_and_metadata(file, owner, media_format):
+def save_media_and_metadata(ingested, owner, media_format):
     try:
         media_folder = app.config['MEDIA_FOLDER']
-        file_path = os.path.join(media_folder, secure_filename(file.filename))
-        file.save(file_path)  
+        file_path = promote(ingested, media_folder)
 
         if not os.path.exists(file_path):
-            raise Exception(f"Failed to save the file: {file.filename}")
+            raise Exception(f"Failed to save the file: {ingested.filename}")
 
-        metadata_json = prepare_metadata(file_path, owner)
-        metadata_file_path = os.path.join(media_folder, f"{os.path.splitext(file.filename)[0]}.json")
+        metadata_json = prepare_metadata(file_path, owner, ingested.sha256, {
+            "size": ingested.size,
+            "mime_type": ingested.mime_type,
+            "media_format": media_format
+        })
+        metadata_file_path = os.path.join(media_folder, f"{os.path.splitext(ingested.filename)[0]}.json")
         with open(metadata_file_path, 'w') as json_file:
             json_file.write(metadata_json)
 
@@ -213,11 +284,11 @@ def upload_file():
             return jsonify({'error': 'No selected file'})
 
         media_format = 'image'
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
-        file.save(upload_path)
+        ingested = ingest_upload(file, app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+        upload_path = ingested.path
 
         try:
-            status, confidence = pred(upload_path)
+            status, confidence, _ = cached_prediction(ingested.sha256, media_format, pred, upload_path)
             logging.info(f'Prediction: {status}, Confidence: {confidence}')
             save_to_db(status, confidence, media_format)
 
@@ -227,7 +298,7 @@ def upload_file():
             else:
                 logging.info(f"Deepfake detected: Skipping saving of {file.filename}")
 
-            saved_file_path, metadata_file_path = save_media_and_metadata(file, owner, media_format)
+            saved_file_path, metadata_file_path = save_media_and_metadata(ingested, owner, media_format)
 
             return jsonify({
                 'prediction': status, 
@@ -251,27 +322,30 @@ def upload_file():
             return jsonify({'error': 'No selected file'})
 
         media_format = 'audio'
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
-        file.save(upload_path)
+        ingested = ingest_upload(file, app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+        upload_path = ingested.path
 
         try:
-            status, confidence = predictFake(upload_path)
+            status, confidence, details = cached_prediction(ingested.sha256, media_format,
+                                                           lambda path: predictFake(path, ingested.sha256), upload_path)
             logging.info(f'Audio Prediction: {status}, Confidence: {confidence}')
             save_to_db(status, confidence, media_format)
 
             if status == "real":
-                saved_file_path, metadata_file_path = save_media_and_metadata(file, owner, media_format)
+                saved_file_path, metadata_file_path = save_media_and_metadata(ingested, owner, media_format)
                 return jsonify({
                     'prediction': status, 
                     'confidence': confidence,
-                    'metadata_file': metadata_file_path
+                    'metadata_file': metadata_file_path,
+                    **details
                 })
             else:
                 logging.info(f"Deepfake detected: Skipping saving of {file.filename}")
                 return jsonify({
                     'prediction': status, 
                     'confidence': confidence,
-                    'message': "Deepfake detected, file not saved."
+                    'message': "Deepfake detected, file not saved.",
+                    **details
                 })
 
         except Exception as e:
@@ -288,32 +362,16 @@ def upload_file():
             return jsonify({'error': 'No selected file'})
 
         media_format = 'video'
-        upload_path = os.path.join(app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
-        file.save(upload_path)
+        ingested = ingest_upload(file, app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+        upload_path = ingested.path
 
         try:
-            paths = save_images(upload_path)
-            predictions = []
-            confidences = []
-
-            for i in paths:
-                try:
-                    status, confidence = pred(i)
-                    predictions.append(status)
-                    confidences.append(confidence)
-                    logging.info(f'Frame Prediction: {status} for image {i}, Confidence: {confidence}')
-                except Exception as e:
-                    predictions.append("error")
-                    confidences.append(0)
-                    logging.error(f'Error in frame prediction for image {i}: {str(e)}')
-
-            final_prediction = find_mode(predictions)
-            final_confidence = sum(confidences) / len(confidences)
+            final_prediction, final_confidence, _ = cached_prediction(ingested.sha256, media_format, pred_video, upload_path)
             logging.info(f'Mode Prediction: {final_prediction}, Average Confidence: {final_confidence}')
             save_to_db(final_prediction, final_confidence, media_format)
 
             if final_prediction == "real":
-                saved_file_path, metadata_file_path = save_media_and_metadata(file, owner, media_format)
+                saved_file_path, metadata_file_path = save_media_and_metadata(ingested, owner, media_format)
                 return jsonify({
                     'prediction': final_prediction, 
                     'confidence': final_confidence,
@@ -338,6 +396,148 @@ def upload_file():
     else:
         return jsonify({'error': 'No valid file provided'})
 
+job_manager = JobManager('jobs.db', max_workers=app.config['JOB_WORKERS'], max_pending=app.config['JOB_MAX_PENDING'])
+
+def run_media_job(payload, progress):
+    ingested = IngestedFile(**payload['file'])
+    media_format = payload['media_format']
+    predict = {
+        'image': pred,
+        'audio': lambda path: predictFake(path, ingested.sha256),
+        'video': pred_video
+    }[media_format]
+
+    try:
+        if not os.path.exists(ingested.path):
+            raise FileNotFoundError(f"Upload for job is missing: {ingested.filename}")
+        progress(0.1)
+
+        status, confidence, details = cached_prediction(ingested.sha256, media_format, predict, ingested.path)
+        logging.info(f'Job Prediction ({media_format}): {status}, Confidence: {confidence}')
+        save_to_db(status, confidence, media_format)
+        progress(0.9)
+
+        result = {'prediction': status, 'confidence': confidence, **details}
+        if status == "real":
+            saved_file_path, result['metadata_file'] = save_media_and_metadata(ingested, payload['owner'], media_format)
+        else:
+            result['message'] = "Deepfake detected, file not saved."
+        return result
+
+    finally:
+        if os.path.exists(ingested.path):
+            os.remove(ingested.path)
+
+job_manager.register('media', run_media_job)
+app.config['JOB_ORPHAN_TIMEOUT'] = 60
+
+@app.before_request
+def start_serving():
+    # Runs once per serving process, whatever server imported the app; the debug reloader's parent never serves
+    job_manager.start()
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    media_format = next((name for name in ('image', 'audio', 'video') if name in request.files), None)
+    if media_format is None:
+        return jsonify({'error': 'No valid file provided'}), 400
+
+    file = request.files[media_format]
+    if not file.filename:
+        return jsonify({'error': 'No selected file'}), 400
+
+    ingested = ingest_upload(file, app.config['UPLOAD_FOLDER'], secure_filename(file.filename))
+    try:
+        job_id = job_manager.submit('media', {
+            'media_format': media_format,
+            'owner': "DeepTracers",
+            'file': ingested._asdict()
+        })
+    except JobQueueFull as e:
+        os.remove(ingested.path)
+        return jsonify({'error': str(e)}), 503
+
+    return jsonify({'job_id': job_id, 'status': 'queued'}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if job_manager.get(job_id) is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def stream():
+        revision, orphaned_since = None, None
+        while True:
+            latest, job = job_manager.wait_for_update(job_id, revision)
+            if latest != revision:
+                revision = latest
+                yield f"data: {json.dumps(job)}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            if job['status'] in ('done', 'failed'):
+                break
+
+            # Normally another serving process adopts a dead worker's job; give up if none does
+            orphaned_since = (orphaned_since or time.time()) if job_manager.orphaned(job_id) else None
+            if orphaned_since and time.time() - orphaned_since > app.config['JOB_ORPHAN_TIMEOUT']:
+                yield f"event: orphaned\ndata: {json.dumps(job)}\n\n"
+                break
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/audio/batch', methods=['POST'])
+def score_audio_files():
+    global audio_pool
+
+    files = [file for file in request.files.getlist('audio') if file.filename]
+    if not files:
+        return jsonify({'error': 'No audio files provided'}), 400
+
+    ingested = [ingest_upload(file, app.config['UPLOAD_FOLDER'], secure_filename(file.filename)) for file in files]
+    score = lambda pool: score_audio_batch([item.path for item in ingested], audio_model, frontend=audio_frontend,
+                                           content_hashes=[item.sha256 for item in ingested], cache=feature_cache,
+                                           executor=pool)
+    try:
+        try:
+            results = score(audio_pool)
+        except BrokenProcessPool:
+            with audio_pool_lock:
+                # Forking replacements from the running server is unsafe, so lost workers become threads
+                if not isinstance(audio_pool, ThreadPoolExecutor):
+                    logging.warning('Audio feature workers died, continuing with threads')
+                    audio_pool = ThreadPoolExecutor(app.config['AUDIO_BATCH_WORKERS'])
+            results = score(audio_pool)
+    finally:
+        for item in ingested:
+            if os.path.exists(item.path):
+                os.remove(item.path)
+
+    return jsonify([
+        {'filename': item.filename, 'file_hash': item.sha256, **result}
+        for item, result in zip(ingested, results)
+    ])
+
+@app.route('/models', methods=['GET'])
+def model_stats():
+    return jsonify(registry.stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'boot': BOOT_REPORT,
+        'face_batcher': face_batcher.stats(),
+        'prediction_cache': prediction_cache.stats(),
+        'prediction_recorder': recorder.stats()
+    })
+
 if __name__ == '__main__':
-    init_db()  
+    # With the debug reloader only the serving child process should pick up unfinished jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        job_manager.start()
     app.run(debug=True, port=5000, host='0.0.0.0')
@@ -0,0 +1,265 @@
+import sys
+import inspect
+import argparse
+import numpy as np
+import librosa
+import scipy.fft
+import scipy.signal
+import soundfile as sf
+
+SAMPLE_RATE = 16000
+N_MFCC = 40
+MAX_LENGTH = 500
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+BLOCK_SECONDS = 60
+
+# Match whatever padding the installed librosa uses so the fast path stays comparable to mfcc_features
+STFT_PAD_MODE = inspect.signature(librosa.stft).parameters['pad_mode'].default
+
+# The model was trained on librosa.load's default resampling (kaiser_best in the pinned librosa 0.9.2);
+# the others are faster but shift the features (see `check`)
+DEFAULT_RESAMPLER = inspect.signature(librosa.load).parameters['res_type'].default
+RESAMPLERS = ['soxr_hq', 'soxr_mq', 'soxr_lq', 'polyphase', 'kaiser_best', 'kaiser_fast']
+DECODERS = ['soundfile', 'librosa']
+
+
+def load_audio(path, sr=SAMPLE_RATE):
+    y, _ = librosa.load(path, sr=sr)
+    return y
+
+
+def fit_length(mfccs, max_length=MAX_LENGTH):
+    if mfccs.shape[-1] < max_length:
+        pad = [(0, 0)] * (mfccs.ndim - 1) + [(0, max_length - mfccs.shape[-1])]
+        return np.pad(mfccs, pad, mode='constant')
+    return mfccs[..., :max_length]
+
+
+def mfcc_features(y, sr=SAMPLE_RATE, n_mfcc=N_MFCC, max_length=MAX_LENGTH):
+    mfccs = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc)
+    return fit_length(mfccs, max_length)
+
+
+class AudioFrontend:
+    def __init__(self, sr=SAMPLE_RATE, decoder='soundfile', resampler=DEFAULT_RESAMPLER, n_mfcc=N_MFCC,
+                 n_fft=N_FFT, hop_length=HOP_LENGTH, n_mels=N_MELS, max_length=MAX_LENGTH):
+        if decoder not in DECODERS:
+            raise ValueError(f'Unknown decoder: {decoder}')
+        if resampler not in RESAMPLERS:
+            raise ValueError(f'Unknown resampler: {resampler}')
+
+        self.sr = sr
+        self.decoder = decoder
+        self.resampler = resampler
+        self.n_mfcc = n_mfcc
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.n_mels = n_mels
+        self.max_length = max_length
+
+        self._window = scipy.signal.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+        self._mel_basis = librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels).astype(np.float32)
+
+    def params(self):
+        # Decoder and resampler change the samples, so they are part of the feature identity
+        params = {
+            'sr': self.sr, 'decoder': self.decoder, 'n_mfcc': self.n_mfcc,
+            'n_fft': self.n_fft, 'hop_length': self.hop_length, 'n_mels': self.n_mels,
+            'max_length': self.max_length, 'pad_mode': STFT_PAD_MODE
+        }
+        # The librosa decoder always resamples with librosa.load's default, whatever resampler is set
+        if self.decoder != 'librosa':
+            params['resampler'] = self.resampler
+        return params
+
+    def decode_blocks(self, path, block_seconds=BLOCK_SECONDS):
+        if self.decoder == 'librosa':
+            yield load_audio(path, self.sr)
+            return
+
+        try:
+            source = sf.SoundFile(path)
+        except RuntimeError:
+            # Formats libsndfile cannot read (e.g. some mp3/m4a) are streamed through ffmpeg instead
+            yield from self._decode_stream(path, block_seconds)
+            return
+
+        with source:
+            # Whole seconds keep every block boundary on an exact output sample for the overlap resamplers
+            blocksize = source.samplerate * max(int(round(block_seconds)), 1)
+            blocks = source.blocks(blocksize=blocksize, dtype='float32', always_2d=True)
+            yield from self._resample_blocks((block.mean(axis=1) for block in blocks), source.samplerate)
+
+    def _decode_stream(self, path, block_seconds):
+        import av
+        with av.open(path) as container:
+            if not container.streams.audio:
+                raise ValueError(f'{path} has no audio stream')
+            stream = container.streams.audio[0]
+            orig_sr = stream.codec_context.sample_rate
+            blocksize = orig_sr * max(int(round(block_seconds)), 1)
+            # Only the sample format is converted; downmixing and resampling match the soundfile path
+            converter = av.AudioResampler(format='fltp')
+
+            def blocks():
+                pending, size = [], 0
+                for frame in container.decode(stream):
+                    for converted in converter.resample(frame):
+                        samples = converted.to_ndarray().mean(axis=0)
+                        pending.append(samples)
+                        size += len(samples)
+                    while size >= blocksize:
+                        buffer = np.concatenate(pending)
+                        yield buffer[:blocksize]
+                        pending, size = [buffer[blocksize:]], size - blocksize
+                for converted in converter.resample(None):
+                    pending.append(converted.to_ndarray().mean(axis=0))
+                rest = np.concatenate(pending) if pending else np.zeros(0, dtype=np.float32)
+                if len(rest):
+                    yield rest
+
+            yield from self._resample_blocks(blocks(), orig_sr)
+
+    def _resample_blocks(self, blocks, orig_sr):
+        resample = self._block_resampler(orig_sr)
+        for block in blocks:
+            yield resample(block, False)
+        tail = resample(np.zeros(0, dtype=np.float32), True)
+        if len(tail):
+            yield tail
+
+    def resample(self, y, orig_sr):
+        """Whole-signal resample with the configured resampler, the reference for the block-wise decode."""
+        if orig_sr == self.sr:
+            return y
+        if self.resampler.startswith('soxr'):
+            import soxr
+            return soxr.resample(y, orig_sr, self.sr, quality=self.resampler.split('_')[1].upper())
+        if self.resampler == 'polyphase':
+            from math import gcd
+            divisor = gcd(int(orig_sr), self.sr)
+            return scipy.signal.resample_poly(y, self.sr // divisor, int(orig_sr) // divisor)
+        return librosa.resample(y, orig_sr=orig_sr, target_sr=self.sr, res_type=self.resampler)
+
+    def _block_resampler(self, orig_sr):
+        if orig_sr == self.sr:
+            return lambda block, last: block
+
+        if self.resampler.startswith('soxr'):
+            import soxr
+            stream = soxr.ResampleStream(orig_sr, self.sr, 1, dtype='float32',
+                                         quality=self.resampler.split('_')[1].upper())
+            return lambda block, last: stream.resample_chunk(block, last=last)
+
+        if self.resampler == 'polyphase':
+            from math import gcd
+            divisor = gcd(int(orig_sr), self.sr)
+            up, down = self.sr // divisor, int(orig_sr) // divisor
+            return self._overlap_resampler(orig_sr, lambda y: scipy.signal.resample_poly(y, up, down))
+
+        return self._overlap_resampler(orig_sr, lambda y: librosa.resample(y, orig_sr=orig_sr, target_sr=self.sr,
+                                                                           res_type=self.resampler))
+
+    def _overlap_resampler(self, orig_sr, resample):
+        """Stateless resamplers see each block together with about a second of its neighbours on both sides
+        and keep only the block's own output, so block edges match a whole-file resample. Output therefore
+        lags one block behind the input."""
+        from math import gcd
+        orig_sr = int(orig_sr)
+        divisor = gcd(orig_sr, self.sr)
+        up, down = self.sr // divisor, orig_sr // divisor
+        # Context and block starts are whole multiples of `down`, so they map onto exact output positions
+        context = down * -(-orig_sr // down)
+        state = {'history': np.zeros(0, dtype=np.float32), 'pending': None}
+
+        def run(block, last):
+            pending, state['pending'] = state['pending'], (None if last else block)
+            if pending is None:
+                if not last or not len(block):
+                    return np.zeros(0, dtype=np.float32)
+                pending, block = block, np.zeros(0, dtype=np.float32)
+
+            left, right = state['history'][-context:], block[:context]
+            out = resample(np.concatenate([left, pending, right]))
+            start = len(left) * up // down
+            stop = start + len(pending) * up // down if len(right) else len(out)
+            state['history'] = np.concatenate([left, pending])[-context:]
+            produced = np.asarray(out[start:stop], dtype=np.float32)
+            if last and len(block):
+                # The final call also flushes the block it was given
+                produced = np.concatenate([produced, run(block, True)])
+            return produced
+
+        return run
+
+    def load(self, path):
+        return np.concatenate(list(self.decode_blocks(path)))
+
+    def mfcc_batch(self, windows):
+        windows = np.asarray(windows, dtype=np.float32)
+        pad = self.n_fft // 2
+        padded = np.pad(windows, ((0, 0), (pad, pad)), mode=STFT_PAD_MODE)
+        frames = np.lib.stride_tricks.sliding_window_view(padded, self.n_fft, axis=-1)[:, ::self.hop_length]
+
+        spectrum = np.fft.rfft(frames * self._window, axis=-1)
+        power = spectrum.real ** 2 + spectrum.imag ** 2
+        mel = power.astype(np.float32) @ self._mel_basis.T
+
+        db = 10.0 * np.log10(np.maximum(mel, 1e-10))
+        db = np.maximum(db, db.max(axis=(1, 2), keepdims=True) - 80.0)
+        mfccs = scipy.fft.dct(db, type=2, norm='ortho', axis=-1)[..., :self.n_mfcc]
+        return np.swapaxes(mfccs, 1, 2)
+
+    def mfcc(self, y):
+        return self.mfcc_batch(y[np.newaxis])[0]
+
+    def features(self, y):
+        return fit_length(self.mfcc(y), self.max_length)
+
+    def features_batch(self, windows):
+        return fit_length(self.mfcc_batch(windows), self.max_length)
+
+
+default_frontend = AudioFrontend()
+
+
+def check(paths, frontend, tolerance):
+    worst = 0.0
+    for path in paths:
+        reference = mfcc_features(load_audio(path, frontend.sr), frontend.sr, frontend.n_mfcc, frontend.max_length)
+        exact = frontend.features(load_audio(path, frontend.sr))
+        decoded = frontend.load(path)
+        # Whole-file resample with the same resampler: any difference comes from block-wise decoding.
+        # soxr is called directly, since older librosa releases do not accept the soxr res_types
+        native, orig_sr = librosa.load(path, sr=None)
+        whole = frontend.resample(native, orig_sr)
+        n = min(len(whole), len(decoded))
+        fast = frontend.features(decoded)
+        scale = np.abs(reference).max()
+        mfcc_error = np.abs(exact - reference).max() / scale
+        block_error = np.abs(decoded[:n] - whole[:n]).max() / max(np.abs(whole).max(), 1e-9)
+        # The reference uses librosa.load's default resampling, the one the model was trained on
+        resampler_error = np.abs(fast - reference).mean() / scale
+        worst = max(worst, mfcc_error, block_error, resampler_error)
+        print(f'{path}: MFCC max rel. error {mfcc_error:.2e}, block decode max rel. error {block_error:.2e}, '
+              f'resampler mean rel. error {resampler_error:.2e}')
+    return worst <= tolerance
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the fast audio front end against the librosa reference features')
+    parser.add_argument('paths', nargs='+')
+    parser.add_argument('--resampler', default=DEFAULT_RESAMPLER, choices=RESAMPLERS)
+    parser.add_argument('--decoder', default='soundfile', choices=DECODERS)
+    parser.add_argument('--tolerance', type=float, default=1e-2)
+    args = parser.parse_args()
+
+    ok = check(args.paths, AudioFrontend(decoder=args.decoder, resampler=args.resampler), args.tolerance)
+    print('OK' if ok else f'Features differ by more than {args.tolerance}')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+import sys
+import glob
+import json
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from audio_features import default_frontend, N_MFCC, MAX_LENGTH
+
+
+def window_samples(frontend):
+    return (frontend.max_length - 1) * frontend.hop_length
+
+
+def iter_window_batches(path, frontend=default_frontend, overlap=0.5, batch_windows=32):
+    size = window_samples(frontend)
+    step = max(int(size * (1 - overlap)), 1)
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0
+    emitted = False
+
+    for block in frontend.decode_blocks(path):
+        buffer = np.concatenate([buffer, block])
+        if len(buffer) < size:
+            continue
+
+        starts = np.arange(1 + (len(buffer) - size) // step) * step
+        for i in range(0, len(starts), batch_windows):
+            chunk = starts[i:i + batch_windows]
+            windows = np.stack([buffer[start:start + size] for start in chunk])
+            yield [(offset + int(start), size) for start in chunk], frontend.features_batch(windows)
+
+        consumed = len(starts) * step
+        buffer = buffer[consumed:]
+        offset += consumed
+        emitted = True
+
+    # The tail is only scored when the previous window did not already cover it
+    if len(buffer) and (not emitted or len(buffer) > size - step):
+        yield [(offset, len(buffer))], frontend.features(buffer)[np.newaxis]
+
+
+def score_windows(model_handle, windows):
+    batch = np.asarray(windows).reshape(-1, N_MFCC, MAX_LENGTH)
+    with model_handle as classifier:
+        output = classifier.predict(batch, verbose=0)
+    return [float(confidence) for confidence in output[:, 0]]
+
+
+def cached_window_batches(path, frontend=default_frontend, overlap=0.5, batch_windows=32,
+                          content_hash=None, cache=None):
+    params = {**frontend.params(), 'overlap': overlap}
+    if cache is None or content_hash is None:
+        yield from iter_window_batches(path, frontend, overlap, batch_windows)
+        return
+
+    cached = cache.get(content_hash, params)
+    if cached is not None:
+        windows, spans = cached
+        for i in range(0, len(spans), batch_windows):
+            yield spans[i:i + batch_windows], windows[i:i + batch_windows]
+        return
+
+    writer = cache.writer(content_hash, params)
+    try:
+        for spans, windows in iter_window_batches(path, frontend, overlap, batch_windows):
+            writer.append(spans, windows)
+            yield spans, windows
+        writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def summarize_timeline(path, timeline):
+    if not timeline:
+        raise ValueError(f"No audio samples could be decoded from {path}")
+
+    confidences = np.array([window['confidence'] for window in timeline])
+    confidence = float(confidences.mean())
+    return {
+        'prediction': "fake" if confidence > 0.5 else "real",
+        'confidence': confidence,
+        'max_confidence': float(confidences.max()),
+        'fake_windows': int((confidences > 0.5).sum()),
+        'timeline': timeline
+    }
+
+
+def timeline_entries(spans, confidences, sr):
+    return [{
+        'start': round(start / sr, 3),
+        'end': round((start + length) / sr, 3),
+        'confidence': confidence
+    } for (start, length), confidence in zip(spans, confidences)]
+
+
+def score_audio(path, model_handle, content_hash=None, frontend=default_frontend, cache=None,
+                overlap=0.5, batch_windows=32):
+    timeline = []
+    for spans, windows in cached_window_batches(path, frontend, overlap, batch_windows, content_hash, cache):
+        timeline.extend(timeline_entries(spans, score_windows(model_handle, windows), frontend.sr))
+    return summarize_timeline(path, timeline)
+
+
+def extract_windows(path, frontend=default_frontend, overlap=0.5, content_hash=None, cache=None):
+    spans, windows = [], []
+    for batch_spans, batch_windows in cached_window_batches(path, frontend, overlap, 32, content_hash, cache):
+        spans.extend(batch_spans)
+        windows.append(np.asarray(batch_windows))
+    if not windows:
+        return spans, np.zeros((0, frontend.n_mfcc, frontend.max_length), dtype=np.float32)
+    return spans, np.concatenate(windows)
+
+
+def feature_pool(workers=None, start=False):
+    """Process pool for extract_windows. Workers are forked, which is only safe while the caller runs no other
+    threads: a long-running server must create it with start=True before it loads models or starts threads.
+    Without fork (Windows) threads are used, because spawn would re-run the caller's __main__."""
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return ThreadPoolExecutor(max_workers=workers)
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+    if start:
+        # A fork pool launches all of its workers on the first submit
+        pool.submit(int).result()
+    return pool
+
+
+def score_audio_batch(paths, model_handle, frontend=default_frontend, overlap=0.5, content_hashes=None,
+                      cache=None, executor=None, workers=None, predict_batch=256):
+    content_hashes = content_hashes or [None] * len(paths)
+    pool = executor or feature_pool(workers)
+    try:
+        futures = [pool.submit(extract_windows, path, frontend, overlap, content_hash, cache)
+                   for path, content_hash in zip(paths, content_hashes)]
+        extracted = []
+        for future in futures:
+            try:
+                extracted.append(future.result())
+            except Exception as e:
+                extracted.append(e)
+    finally:
+        if executor is None:
+            pool.shutdown()
+
+    scored = [item for item in extracted if not isinstance(item, Exception) and len(item[0])]
+    confidences = []
+    if scored:
+        stacked = np.concatenate([windows for _, windows in scored])
+        for start in range(0, len(stacked), predict_batch):
+            confidences.extend(score_windows(model_handle, stacked[start:start + predict_batch]))
+
+    results, position = [], 0
+    for path, item in zip(paths, extracted):
+        if isinstance(item, Exception):
+            results.append({'error': str(item) or type(item).__name__})
+            continue
+        spans, _ = item
+        timeline = timeline_entries(spans, confidences[position:position + len(spans)], frontend.sr)
+        position += len(spans)
+        try:
+            results.append(summarize_timeline(path, timeline))
+        except ValueError as e:
+            results.append({'error': str(e)})
+    return results
+
+
+def main():
+    from model_registry import registry, register_audio_models
+    from feature_cache import FeatureCache
+    from ingest import hash_path
+
+    parser = argparse.ArgumentParser(description='Score many audio files with batched model calls')
+    parser.add_argument('inputs', nargs='+', help='audio files or glob patterns')
+    parser.add_argument('--output', default='-', help='JSONL destination (default: stdout)')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk', type=int, default=512, help='files scored per batch call')
+    parser.add_argument('--feature-cache', help='folder for cached MFCC windows')
+    args = parser.parse_args()
+
+    paths = [path for pattern in args.inputs for path in (sorted(glob.glob(pattern)) or [pattern])]
+    cache = FeatureCache(args.feature_cache) if args.feature_cache else None
+
+    register_audio_models()
+    model_handle = registry.get('audio_classifier')
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    with feature_pool(args.workers) as pool:
+        for start in range(0, len(paths), args.chunk):
+            chunk = paths[start:start + args.chunk]
+            hashes = [hash_path(path) for path in chunk] if cache else None
+            for path, result in zip(chunk, score_audio_batch(chunk, model_handle, content_hashes=hashes,
+                                                              cache=cache, executor=pool)):
+                out.write(json.dumps({'path': path, **result}) + '\n')
+            out.flush()
+    if out is not sys.stdout:
+        out.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
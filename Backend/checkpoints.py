@@ -0,0 +1,51 @@
+import os
+import logging
+import torch
+from prediction_cache import checkpoint_version
+
+TRACE_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trace_cache')
+
+
+def load_state_dict(path, key=None, weights_only=True):
+    """Memory-maps the checkpoint so tensors are paged in on demand and forked workers share the pages.
+    A .safetensors file next to the checkpoint is preferred when present."""
+    safetensors_path = os.path.splitext(path)[0] + '.safetensors'
+    if os.path.exists(safetensors_path):
+        from safetensors.torch import load_file
+        return load_file(safetensors_path)
+    try:
+        state = torch.load(path, map_location='cpu', weights_only=weights_only, mmap=True)
+    except RuntimeError:
+        # Files saved in the legacy (non-zip) format cannot be mapped
+        logging.warning(f'{path} is not in the zipfile format, loading it into memory')
+        state = torch.load(path, map_location='cpu', weights_only=weights_only)
+    return state[key] if key else state
+
+
+def load_module(factory, path, key=None, device='cpu', weights_only=True):
+    # Built on the meta device, so no memory or time goes into weights the checkpoint replaces anyway
+    with torch.device('meta'):
+        model = factory()
+    model.load_state_dict(load_state_dict(path, key, weights_only), assign=True)
+    if any(t.is_meta for t in list(model.parameters()) + list(model.buffers())):
+        raise ValueError(f'{path} does not initialise every tensor of {type(model).__name__}')
+    return model.to(device).eval()
+
+
+def traced_module(build, path, tag, example, cache_dir=TRACE_CACHE):
+    """Loads the TorchScript trace of `build()` cached for this checkpoint, tag and torch version,
+    tracing and saving it on the first start."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    cached = os.path.join(cache_dir, f'{name}-{checkpoint_version(path)}-{tag}-torch{torch.__version__}.pt')
+    if os.path.exists(cached):
+        return torch.jit.load(cached, map_location=example.device).eval()
+
+    with torch.no_grad():
+        traced = torch.jit.trace(build(), example)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Workers starting together may trace at the same time; the rename keeps the cache file whole
+    partial = f'{cached}.{os.getpid()}'
+    torch.jit.save(traced, partial)
+    os.replace(partial, cached)
+    logging.info(f'Cached traced {name} at {cached}')
+    return traced.eval()
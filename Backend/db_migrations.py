@@ -0,0 +1,57 @@
+import sqlite3
+from stats_rollups import CREATE_ROLLUPS, BACKFILL_ROLLUPS
+
+# Each entry upgrades the schema by one version; the applied version is kept in PRAGMA user_version.
+MIGRATIONS = [
+    [
+        '''CREATE TABLE IF NOT EXISTS predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT,
+            time TEXT,
+            platform TEXT,
+            status TEXT,
+            confidence REAL,
+            media_format TEXT
+        )''',
+    ],
+    [
+        'CREATE INDEX IF NOT EXISTS idx_predictions_date_time ON predictions (date, time, id)',
+        'CREATE INDEX IF NOT EXISTS idx_predictions_platform_date ON predictions (platform, date, time, id)',
+        'CREATE INDEX IF NOT EXISTS idx_predictions_status_date ON predictions (status, date, time, id)',
+        'CREATE INDEX IF NOT EXISTS idx_predictions_format_date ON predictions (media_format, date, time, id)',
+        'CREATE INDEX IF NOT EXISTS idx_predictions_confidence ON predictions (confidence, id)',
+    ],
+    [
+        CREATE_ROLLUPS,
+        # Rollups written before an interrupted run are rebuilt, so the backfill is safe to rerun
+        'DELETE FROM prediction_rollups',
+        BACKFILL_ROLLUPS,
+    ],
+]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(database):
+    # Every serving process migrates on import; the write lock is taken before the version is read,
+    # so a step another process already applied is skipped instead of run twice
+    conn = sqlite3.connect(database, isolation_level=None, timeout=30)
+    try:
+        while True:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                version = schema_version(conn)
+                if version >= len(MIGRATIONS):
+                    conn.execute('COMMIT')
+                    return version
+                for statement in MIGRATIONS[version]:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {version + 1}')
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                conn.execute('ROLLBACK')
+                raise
+    finally:
+        conn.close()
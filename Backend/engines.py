@@ -0,0 +1,71 @@
+import os
+import numpy as np
+
+ENGINES = ['torch', 'torchscript', 'keras', 'onnxruntime']
+
+
+def check_engine(engine, supported=ENGINES):
+    if engine not in supported:
+        raise ValueError(f'Unknown inference engine: {engine}' if engine not in ENGINES
+                         else f'The {engine} engine cannot run this model')
+
+
+def onnx_path(checkpoint_path):
+    return os.path.splitext(checkpoint_path)[0] + '.onnx'
+
+
+class OnnxModel:
+    """onnxruntime session that can stand in for a torch module (called with a tensor) or a
+    Keras model (predict with an array); outputs come back in the caller's type."""
+
+    def __init__(self, path, device='cpu', threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        providers = ['CPUExecutionProvider']
+        if str(device).startswith('cuda') and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=providers)
+        self._input = self.session.get_inputs()[0].name
+
+    def run(self, x):
+        return self.session.run(None, {self._input: np.ascontiguousarray(x, dtype=np.float32)})[0]
+
+    def __call__(self, x):
+        if isinstance(x, np.ndarray):
+            return self.run(x)
+        import torch
+        return torch.from_numpy(self.run(x.detach().float().cpu().numpy())).to(x.device)
+
+    def predict(self, x, verbose=0):
+        return self.run(x)
+
+    def eval(self):
+        return self
+
+    def parameters(self):
+        return iter(())
+
+
+def export_torch(model, path, input_shape, opset=17):
+    import torch
+    model = model.cpu().eval()
+    with torch.no_grad():
+        torch.onnx.export(model, torch.zeros(1, *input_shape), path, opset_version=opset,
+                          input_names=['input'], output_names=['output'],
+                          dynamic_axes={'input': {0: 'batch'}, 'output': {0: 'batch'}})
+    return path
+
+
+def export_keras(model, path, opset=17):
+    import tensorflow as tf
+    import tf2onnx
+
+    signature = [tf.TensorSpec((None, *model.input_shape[1:]), tf.float32, name='input')]
+    tf2onnx.convert.from_keras(model, input_signature=signature, opset=opset, output_path=path)
+    return path
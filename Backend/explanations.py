@@ -0,0 +1,128 @@
+import hashlib
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+import torch
+
+
+def content_hash(face):
+    array = face.detach().cpu().numpy() if torch.is_tensor(face) else np.asarray(face)
+    digest = hashlib.sha256(str(array.shape).encode())
+    digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()
+
+
+def principal_projection(activations):
+    # Projects each position's channel vector onto the image's first principal component (eigen-smooth CAM)
+    b, c, h, w = activations.shape
+    x = activations.reshape(b, c, h * w).transpose(0, 2, 1)
+    x = x - x.mean(axis=1, keepdims=True)
+    _, _, vt = np.linalg.svd(x, full_matrices=False)
+    return (x @ vt[:, 0, :, None]).reshape(b, h, w)
+
+
+class ExplanationService:
+    """Scores a batch of faces and computes Grad-CAM maps from the same forward pass.
+
+    A persistent hook on `target_layer` captures its activations. The backward pass runs once per batch
+    and only for faces scored fake or explicitly requested. Results are cached by face content hash.
+    The model is shared with the registry, so its parameters and mode are left untouched.
+
+    With `cam_preprocessor` the CAMs come from a second forward over just those faces on that input,
+    otherwise they reuse the scoring pass on the `preprocessor` input."""
+
+    def __init__(self, model, target_layer, preprocessor, threshold=0.8, eigen_smooth=True, cache_items=512,
+                 cam_preprocessor=None):
+        self.model = model
+        self.preprocessor = preprocessor
+        self.cam_preprocessor = cam_preprocessor
+        self.threshold = threshold
+        self.eigen_smooth = eigen_smooth
+        self.cache_items = cache_items
+
+        # Other threads may run the shared model meanwhile; only the explaining thread's forward is captured
+        self._local = threading.local()
+        self._hook = target_layer.register_forward_hook(self._capture)
+        self._cache = OrderedDict()
+        self._stats = {'faces': 0, 'cache_hits': 0, 'forward_faces': 0, 'cams': 0}
+
+    def explain(self, faces, explain=None):
+        """`explain` is None (CAMs for fake faces only), a bool for the whole batch or one value per face.
+        Returns per face a dict with the fake probability, the label and an HxW CAM in [0, 1] or None."""
+        if explain is None or isinstance(explain, bool):
+            explain = [explain] * len(faces)
+        keys = [content_hash(face) for face in faces]
+        results = [self._cache.get(key) for key in keys]
+        run = [i for i, result in enumerate(results) if result is None or (explain[i] and result['cam'] is None)]
+
+        self._stats['faces'] += len(faces)
+        self._stats['cache_hits'] += len(faces) - len(run)
+        if run:
+            for i, result in zip(run, self._run([faces[i] for i in run], [explain[i] for i in run])):
+                results[i] = result
+                self._cache[keys[i]] = result
+        for key in keys:
+            self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_items:
+            self._cache.popitem(last=False)
+        return results
+
+    def stats(self):
+        return dict(self._stats, cached=len(self._cache))
+
+    def close(self):
+        self._hook.remove()
+
+    def _capture(self, module, inputs, output):
+        if not getattr(self._local, 'capturing', False):
+            return None
+        # The layers before the target ran without autograd; the graph starts at this fresh leaf
+        output = output.detach().requires_grad_()
+        torch.set_grad_enabled(True)
+        self._local.activations = output
+        return output
+
+    def _forward(self, x, capture):
+        self._local.capturing, self._local.activations = capture, None
+        try:
+            with torch.no_grad():
+                logits = self.model(x)[:, 0]
+        finally:
+            self._local.capturing = False
+        activations, self._local.activations = self._local.activations, None
+        if capture and activations is None:
+            raise RuntimeError('The Grad-CAM target layer was not part of the forward pass')
+        self._stats['forward_faces'] += len(x)
+        return logits, activations
+
+    def _run(self, faces, explain):
+        x = self.preprocessor(faces)
+        shared = self.cam_preprocessor is None
+        logits, activations = self._forward(x, capture=shared)
+
+        probs = torch.sigmoid(logits.detach().float()).cpu().numpy()
+        rows = [i for i, p in enumerate(probs) if explain[i] or (explain[i] is None and p >= self.threshold)]
+        cams = {}
+        if rows and shared:
+            cams = dict(zip(rows, self._cams(logits, activations, rows, x.shape[-2:])))
+        elif rows:
+            x = self.cam_preprocessor([faces[i] for i in rows])
+            logits, activations = self._forward(x, capture=True)
+            cams = dict(zip(rows, self._cams(logits, activations, list(range(len(rows))), x.shape[-2:])))
+        return [{'fake': float(p), 'label': 'fake' if p >= self.threshold else 'real', 'cam': cams.get(i)}
+                for i, p in enumerate(probs)]
+
+    def _cams(self, logits, activations, rows, size):
+        # Faces do not interact in eval mode, so one backward of the summed scores yields every face's gradient
+        gradients = torch.autograd.grad(logits[rows].sum(), activations)[0][rows]
+        weighted = (gradients.mean(dim=(2, 3), keepdim=True) * activations.detach()[rows]).float().cpu().numpy()
+        cams = principal_projection(weighted) if self.eigen_smooth else weighted.sum(axis=1)
+        self._stats['cams'] += len(rows)
+
+        h, w = size
+        scaled = []
+        for cam in np.maximum(cams, 0):
+            cam = cam - cam.min()
+            scaled.append(cv2.resize(cam / (1e-7 + cam.max()), (w, h)))
+        return scaled
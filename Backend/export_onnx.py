@@ -0,0 +1,92 @@
+import os
+import sys
+import glob
+import json
+import argparse
+import importlib.util
+import numpy as np
+from model_registry import BACKEND_DIR, INCEPTION_CHECKPOINT, AUDIO_CLASSIFIER, load_inception, load_audio_classifier
+from engines import OnnxModel, onnx_path, export_torch, export_keras
+from audio_features import N_MFCC, MAX_LENGTH
+
+AV_DIR = os.path.join(BACKEND_DIR, '..', 'Audiovisualmodel')
+MODELS = ['inception', 'audio', 'av']
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def torch_parity(model, path, x):
+    import torch
+    with torch.no_grad():
+        reference = sigmoid(model(torch.from_numpy(x)).float().numpy())
+    exported = sigmoid(OnnxModel(path).run(x))
+    return float(np.abs(reference - exported).max())
+
+
+def export_inception(checkpoint, rng, samples):
+    model = load_inception('cpu', checkpoint)
+    path = export_torch(model, onnx_path(checkpoint), (3, 160, 160))
+    x = rng.uniform(0, 1, (samples, 3, 160, 160)).astype(np.float32)
+    return [{'model': 'inception', 'path': path, 'max_abs_diff': torch_parity(model, path, x)}]
+
+
+def export_audio(model_path, rng, samples):
+    model = load_audio_classifier(model_path)
+    path = export_keras(model, onnx_path(model_path))
+    x = rng.normal(0, 50, (samples, N_MFCC, MAX_LENGTH)).astype(np.float32)
+    reference = np.asarray(model.predict(x, verbose=0), dtype=np.float32)
+    exported = OnnxModel(path).run(x)
+    return [{'model': 'audio', 'path': path, 'max_abs_diff': float(np.abs(reference - exported).max())}]
+
+
+def export_av(weights_dir, config, rng, samples):
+    spec = importlib.util.spec_from_file_location('deeptracer_av', os.path.join(AV_DIR, 'deeptracer-av.py'))
+    av = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(av)
+    with open(config) as f:
+        cfg = json.load(f)
+
+    results = []
+    x = rng.normal(0, 1, (samples, 3, cfg['size'], cfg['size'])).astype(np.float32)
+    for checkpoint in sorted(glob.glob(os.path.join(weights_dir, '*.pt'))):
+        member = av.load_ensemble([checkpoint], cfg['arch'], 'cpu').models[0]
+        path = export_torch(member, onnx_path(checkpoint), (3, cfg['size'], cfg['size']))
+        results.append({'model': f'av/{os.path.basename(checkpoint)}', 'path': path,
+                        'max_abs_diff': torch_parity(member, path, x)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the classifiers to ONNX and check parity with the originals')
+    parser.add_argument('--models', default=','.join(MODELS), help='comma separated subset of ' + ','.join(MODELS))
+    parser.add_argument('--inception-checkpoint', default=INCEPTION_CHECKPOINT)
+    parser.add_argument('--audio-model', default=AUDIO_CLASSIFIER)
+    parser.add_argument('--av-weights', default=os.path.join(AV_DIR, 'weights'))
+    parser.add_argument('--av-config', default=os.path.join(AV_DIR, 'config.json'))
+    parser.add_argument('--samples', type=int, default=8, help='random inputs used for the parity check')
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='allowed probability difference')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    results = []
+    for name in args.models.split(','):
+        if name == 'inception':
+            results += export_inception(args.inception_checkpoint, rng, args.samples)
+        elif name == 'audio':
+            results += export_audio(args.audio_model, rng, args.samples)
+        elif name == 'av':
+            results += export_av(args.av_weights, args.av_config, rng, args.samples)
+        else:
+            parser.error(f'Unknown model: {name}')
+
+    failed = [result for result in results if result['max_abs_diff'] > args.tolerance]
+    for result in results:
+        status = 'FAIL' if result in failed else 'ok'
+        print(f"{status:4s} {result['model']:40s} max |p - p_onnx| {result['max_abs_diff']:.2e}  {result['path']}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+import threading
+import cv2
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def crop_range(face):
+    return float(face.min()), float(face.max())
+
+
+def minmax_uint8(faces, ranges):
+    ranges = np.asarray(ranges, dtype=np.float32).reshape(-1, 2)
+    lo, extent = ranges[:, 0, None, None, None], (ranges[:, 1] - ranges[:, 0])[:, None, None, None]
+    # cv2.NORM_MINMAX maps a constant image to zeros
+    scale = np.where(extent > 0, 255.0 / np.maximum(extent, 1e-6), 0).astype(np.float32)
+    x = (np.stack(faces).astype(np.float32) - lo) * scale
+    return np.clip(np.rint(x), 0, 255).astype(np.uint8)
+
+
+class FacePreprocessor:
+    """Turns a list of face crops into one normalised NCHW float batch.
+
+    Crops are HWC uint8 arrays (gathered in a reusable per-thread uint8 staging buffer) or CHW float
+    tensors holding 0-255 values (stacked and resized with bilinear interpolation).
+    The float batch is allocated per call: callers such as the scan pipeline queue it for another thread.
+    Scaling is either per-face min-max (matching cv2.NORM_MINMAX) or a plain division by 255,
+    followed by optional mean/std normalisation; all of it runs as whole-batch tensor ops."""
+
+    def __init__(self, size, mean=None, std=None, minmax=False, device='cpu'):
+        self.size = tuple(size)
+        self.minmax = minmax
+        self.device = device
+        self.mean = torch.tensor(mean, device=device).view(1, 3, 1, 1) if mean is not None else None
+        self.std = torch.tensor(std, device=device).view(1, 3, 1, 1) if std is not None else None
+        self._local = threading.local()
+
+    def __call__(self, faces, ranges=None):
+        if torch.is_tensor(faces[0]):
+            x = self._from_tensors(faces)
+        else:
+            x = self._from_arrays(faces)
+
+        n = len(faces)
+        if self.minmax:
+            if ranges is None:
+                lo, hi = x.amin(dim=(1, 2, 3)), x.amax(dim=(1, 2, 3))
+            else:
+                ranges = torch.as_tensor(np.asarray(ranges, dtype=np.float32).reshape(-1, 2), device=x.device)
+                lo, hi = ranges[:, 0], ranges[:, 1]
+            extent = hi - lo
+            scale = torch.where(extent > 0, 1 / extent.clamp(min=1e-6), torch.zeros_like(extent))
+            x.sub_(lo.view(n, 1, 1, 1)).mul_(scale.view(n, 1, 1, 1))
+        else:
+            x.mul_(1 / 255.0)
+
+        if self.mean is not None:
+            x.sub_(self.mean).div_(self.std)
+        return x
+
+    def _buffer(self, key, shape, make):
+        buffers = self._local.__dict__.setdefault('buffers', {})
+        buffer = buffers.get(key)
+        if buffer is None or len(buffer) < shape[0]:
+            buffer = make((max(shape[0], 2 * len(buffer) if buffer is not None else 0), *shape[1:]))
+            buffers[key] = buffer
+        return buffer[:shape[0]]
+
+    def _from_arrays(self, faces):
+        w, h = self.size
+        batch = self._buffer(('uint8', h, w), (len(faces), h, w, 3), lambda shape: np.empty(shape, dtype=np.uint8))
+        for i, face in enumerate(faces):
+            # Assigned rather than resized into dst=: OpenCV silently returns a new array when dst does not fit
+            batch[i] = face if face.shape[:2] == (h, w) else cv2.resize(face, (w, h))
+
+        x = torch.empty((len(faces), 3, h, w), dtype=torch.float32, device=self.device)
+        x.copy_(torch.from_numpy(batch).to(self.device).permute(0, 3, 1, 2))
+        return x
+
+    def _from_tensors(self, faces):
+        x = torch.stack(faces).to(self.device, torch.float32)
+        w, h = self.size
+        if x.shape[-2:] != (h, w):
+            x = F.interpolate(x, size=(h, w), mode='bilinear', align_corners=False)
+        return x
@@ -0,0 +1,170 @@
+import cv2
+import numpy as np
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(x2 - x1, 0) * max(y2 - y1, 0)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class Track:
+    def __init__(self, track_id, box, prob):
+        self.id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.prob = float(prob)
+
+
+class FaceTracker:
+    """Runs the detector every `detect_every` frames or on a scene change and follows faces with
+    Lucas-Kanade flow in between. `detect(frames)` returns, per frame, None or (boxes, probs)."""
+
+    def __init__(self, detect, detect_every=5, min_confidence=0.5, match_iou=0.3, scene_threshold=0.5,
+                 flow_size=480):
+        self.detect = detect
+        self.detect_every = max(int(detect_every), 1)
+        self.min_confidence = min_confidence
+        self.match_iou = match_iou
+        self.scene_threshold = scene_threshold
+        self.flow_size = flow_size
+
+        self.tracks = []
+        self.next_id = 0
+        self.frame_index = 0
+        self._prev_gray = None
+        self._prev_hist = None
+        self._stats = {'frames': 0, 'scheduled': 0, 'scene_changes': 0, 'fallbacks': 0}
+
+    def track(self, frames):
+        grays = [self._gray(frame) for frame in frames]
+        hists = [cv2.calcHist([gray], [0], None, [32], [0, 256]) for gray in grays]
+        scheduled = [self._needs_detection(i, hists) for i in range(len(frames))]
+        self._stats['scheduled'] += sum(scheduled)
+
+        # Scheduled detections are batched; fallbacks found while tracking run one frame at a time
+        detected = dict(zip(
+            [i for i, needed in enumerate(scheduled) if needed],
+            self.detect([frame for frame, needed in zip(frames, scheduled) if needed]) if any(scheduled) else []
+        ))
+
+        results, ids = [], []
+        for i, frame in enumerate(frames):
+            scale = grays[i].shape[1] / frame.shape[1]
+            if i in detected:
+                self._update(detected[i], grays[i], scale)
+            elif not self._propagate(grays[i], scale):
+                self._stats['fallbacks'] += 1
+                self._update(self.detect([frame])[0], grays[i], scale)
+
+            self._prev_gray, self._prev_hist = grays[i], hists[i]
+            self.frame_index += 1
+            self._stats['frames'] += 1
+
+            if self.tracks:
+                results.append((np.stack([t.box for t in self.tracks]),
+                                np.array([t.prob for t in self.tracks], dtype=np.float32), None))
+                ids.append([t.id for t in self.tracks])
+            else:
+                results.append(None)
+                ids.append([])
+        return results, ids
+
+    def stats(self):
+        return dict(self._stats, tracks=self.next_id)
+
+    def _gray(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY) if frame.ndim == 3 else frame
+        h, w = gray.shape
+        if max(h, w) > self.flow_size:
+            scale = self.flow_size / max(h, w)
+            gray = cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+        return gray
+
+    def _needs_detection(self, i, hists):
+        # Decided before tracking so the batch's scheduled detections can run in one call
+        previous = hists[i - 1] if i > 0 else self._prev_hist
+        if previous is None:
+            return True
+        if cv2.compareHist(previous, hists[i], cv2.HISTCMP_CORREL) < self.scene_threshold:
+            self._stats['scene_changes'] += 1
+            return True
+        return (self.frame_index + i) % self.detect_every == 0
+
+    def _update(self, detection, gray, scale):
+        if detection is None or len(detection[0]) == 0:
+            self.tracks = []
+            return
+
+        boxes, probs = detection[0], detection[1]
+        # Match against where the tracks would be now, not where they were last seen
+        self._propagate(gray, scale)
+        candidates = sorted(((iou(track.box, box), t, d) for t, track in enumerate(self.tracks)
+                             for d, box in enumerate(boxes)), reverse=True)
+
+        matched, used_tracks, used_boxes = {}, set(), set()
+        for overlap, t, d in candidates:
+            if overlap < self.match_iou:
+                break
+            if t in used_tracks or d in used_boxes:
+                continue
+            matched[d] = self.tracks[t].id
+            used_tracks.add(t)
+            used_boxes.add(d)
+
+        self.tracks = []
+        for d, (box, prob) in enumerate(zip(boxes, probs)):
+            track_id = matched.get(d)
+            if track_id is None:
+                track_id = self.next_id
+                self.next_id += 1
+            self.tracks.append(Track(track_id, box, prob))
+
+    def _propagate(self, gray, scale):
+        # With no faces in view nothing can drift, so waiting for the next scheduled detection is safe
+        if not self.tracks:
+            return True
+        if self._prev_gray is None:
+            return False
+        tracks = []
+        for track in self.tracks:
+            box, confidence = self._flow(self._prev_gray, gray, track.box * scale)
+            if box is None or confidence < self.min_confidence:
+                return False
+            tracks.append(Track(track.id, box / scale, track.prob))
+        self.tracks = tracks
+        return True
+
+    def _flow(self, prev_gray, gray, box):
+        h, w = prev_gray.shape
+        x1, y1 = int(max(box[0], 0)), int(max(box[1], 0))
+        x2, y2 = int(min(box[2], w)), int(min(box[3], h))
+        if x2 - x1 < 8 or y2 - y1 < 8:
+            return None, 0.0
+
+        mask = np.zeros_like(prev_gray)
+        mask[y1:y2, x1:x2] = 255
+        points = cv2.goodFeaturesToTrack(prev_gray, maxCorners=40, qualityLevel=0.01, minDistance=3, mask=mask)
+        if points is None or len(points) < 4:
+            return None, 0.0
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+        back, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, moved, None, winSize=(15, 15), maxLevel=2)
+        # Forward-backward consistency is the cheap re-verification of each propagated box
+        error = np.linalg.norm(points - back, axis=2).ravel()
+        good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < 1.0)
+        confidence = float(good.mean())
+        if good.sum() < 4:
+            return None, confidence
+
+        before, after = points[good].reshape(-1, 2), moved[good].reshape(-1, 2)
+        shift = np.median(after - before, axis=0)
+        spread_before = np.linalg.norm(before - before.mean(axis=0), axis=1)
+        spread_after = np.linalg.norm(after - after.mean(axis=0), axis=1)
+        scale = float(np.median(spread_after[spread_before > 0] / spread_before[spread_before > 0])) \
+            if np.any(spread_before > 0) else 1.0
+
+        cx, cy = (box[0] + box[2]) / 2 + shift[0], (box[1] + box[3]) / 2 + shift[1]
+        half_w, half_h = (box[2] - box[0]) * scale / 2, (box[3] - box[1]) * scale / 2
+        return np.array([cx - half_w, cy - half_h, cx + half_w, cy + half_h], dtype=np.float32), confidence
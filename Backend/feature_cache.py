@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import numpy as np
+
+
+class FeatureCache:
+    """Memory-mapped MFCC windows on disk, bounded by total size (least recently used entries go first)
+    and by age since last use."""
+
+    def __init__(self, folder='feature_cache', max_bytes=2 * 1024 ** 3, max_age=7 * 24 * 3600):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, content_hash, params):
+        identity = json.dumps({'content_hash': content_hash, **params}, sort_keys=True)
+        return hashlib.sha256(identity.encode()).hexdigest()
+
+    def get(self, content_hash, params):
+        base = os.path.join(self.folder, self.key(content_hash, params))
+        try:
+            with open(f'{base}.json') as f:
+                meta = json.load(f)
+            if not meta['spans']:
+                windows = np.zeros((0, *(meta['shape'] or [])), dtype=np.float32)
+            else:
+                windows = np.memmap(f'{base}.f32', dtype=np.float32, mode='r',
+                                    shape=(len(meta['spans']), *meta['shape']))
+            # The metadata file's mtime records the last use for eviction
+            os.utime(f'{base}.json')
+        except FileNotFoundError:
+            # Missing, or evicted by another process between the two reads
+            return None
+        return windows, [tuple(span) for span in meta['spans']]
+
+    def writer(self, content_hash, params):
+        return FeatureWriter(os.path.join(self.folder, self.key(content_hash, params)), self)
+
+    def evict(self):
+        entries, total, now = [], 0, time.time()
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json') or name.count('.') > 1:
+                continue
+            base = os.path.join(self.folder, name[:-len('.json')])
+            try:
+                used = os.path.getmtime(f'{base}.json')
+                size = os.path.getsize(f'{base}.f32') if os.path.exists(f'{base}.f32') else 0
+            except FileNotFoundError:
+                continue
+            entries.append((used, size, base))
+            total += size
+
+        evicted = 0
+        for used, size, base in sorted(entries):
+            if total <= self.max_bytes and now - used <= self.max_age:
+                break
+            # Metadata goes first so readers treat the entry as a miss; open memmaps stay valid
+            for path in (f'{base}.json', f'{base}.f32'):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            evicted += 1
+        return evicted
+
+
+class FeatureWriter:
+    def __init__(self, base, cache=None):
+        self.base = base
+        self.cache = cache
+        self._staging = f'{base}.{uuid.uuid4().hex}.tmp'
+        self._file = open(self._staging, 'wb')
+        self._spans = []
+        self._shape = None
+
+    def append(self, spans, windows):
+        windows = np.ascontiguousarray(windows, dtype=np.float32)
+        self._shape = list(windows.shape[1:])
+        windows.tofile(self._file)
+        self._spans.extend(spans)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self._staging, f'{self.base}.f32')
+        with open(f'{self._staging}.json', 'w') as f:
+            json.dump({'shape': self._shape, 'spans': self._spans}, f)
+        os.replace(f'{self._staging}.json', f'{self.base}.json')
+        if self.cache is not None:
+            self.cache.evict()
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._staging):
+            os.remove(self._staging)
@@ -0,0 +1,97 @@
+import time
+import queue
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import Future
+
+
+class InferenceBatcher:
+    def __init__(self, batch_fn, max_batch_size=16, max_wait_ms=10, name='batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = Counter()
+        self._queue_depths = Counter()
+        self._batches = 0
+        self._items = 0
+
+        self._worker = threading.Thread(target=self._run, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        future = Future()
+        with self._stats_lock:
+            self._queue_depths[self._queue.qsize()] += 1
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._worker.join()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'mean_batch_size': round(self._items / self._batches, 2) if self._batches else 0,
+                'batch_size_histogram': dict(sorted(self._batch_sizes.items())),
+                'queue_depth_histogram': dict(sorted(self._queue_depths.items()))
+            }
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                pending = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if pending is None:
+                self._queue.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+
+            batch = self._collect(first)
+            with self._stats_lock:
+                self._batch_sizes[len(batch)] += 1
+                self._batches += 1
+                self._items += len(batch)
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_fn(items)
+            except Exception as e:
+                logging.error(f'{self.name}: batch of {len(batch)} failed: {e}')
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            if len(results) != len(batch):
+                error = RuntimeError(f'{self.name}: batch_fn returned {len(results)} results for {len(batch)} items')
+                logging.error(str(error))
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
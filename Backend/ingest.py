@@ -0,0 +1,82 @@
+import os
+import shutil
+import uuid
+import hashlib
+import tempfile
+import mimetypes
+from collections import namedtuple
+
+CHUNK_SIZE = 1024 * 1024
+SNIFF_BYTES = 32
+
+IngestedFile = namedtuple('IngestedFile', ['path', 'filename', 'sha256', 'size', 'mime_type'])
+
+SIGNATURES = [
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF8', 'image/gif'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+    (4, b'ftypqt', 'video/quicktime'),
+    (4, b'ftypM4A', 'audio/mp4'),
+    (4, b'ftyp', 'video/mp4'),
+]
+
+RIFF_TYPES = {b'WEBP': 'image/webp', b'WAVE': 'audio/wav', b'AVI ': 'video/x-msvideo'}
+
+
+def sniff_mime(head, filename):
+    if head[:4] == b'RIFF' and head[8:12] in RIFF_TYPES:
+        return RIFF_TYPES[head[8:12]]
+    for offset, signature, mime_type in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return mime_type
+    if len(head) >= 2 and head[0] == 0xff and head[1] & 0xe0 == 0xe0:
+        return 'audio/mpeg'
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def ingest_upload(file, folder, filename):
+    suffix = os.path.splitext(filename)[1]
+    fd, path = tempfile.mkstemp(dir=folder, suffix=suffix)
+
+    sha256_hash = hashlib.sha256()
+    size = 0
+    head = b''
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                sha256_hash.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+
+    return IngestedFile(path, filename, sha256_hash.hexdigest(), size, sniff_mime(head, filename))
+
+
+def hash_path(path):
+    sha256_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+
+def promote(ingested, folder):
+    target = os.path.join(folder, ingested.filename)
+    staging = f"{target}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(ingested.path, staging)
+    except OSError:
+        shutil.copyfile(ingested.path, staging)
+    os.replace(staging, target)
+    return target
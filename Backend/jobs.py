@@ -0,0 +1,182 @@
+import json
+import time
+import uuid
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+FINISHED = ('done', 'failed')
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class JobManager:
+    """Runs jobs on a thread pool and persists them in SQLite.
+
+    Every manager owns the jobs it runs and refreshes their heartbeat. Unfinished jobs whose heartbeat
+    is older than `stale_after` (their process died or restarted) are adopted by whichever serving
+    process notices first; the UPDATE that claims them is atomic, so only one process runs each job."""
+
+    def __init__(self, path='jobs.db', max_workers=2, max_pending=64, heartbeat_interval=5, stale_after=20):
+        self.max_pending = max_pending
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self.owner = uuid.uuid4().hex
+        self._handlers = {}
+        self._pending = 0
+        self._revisions = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            payload TEXT,
+            status TEXT,
+            progress REAL,
+            result TEXT,
+            error TEXT,
+            created REAL,
+            updated REAL
+        )''')
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        for column in ('owner TEXT', 'heartbeat REAL'):
+            if column.split()[0] not in columns:
+                self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column}')
+        self._conn.commit()
+        self._started = False
+        self._stop = threading.Event()
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def submit(self, kind, payload):
+        if kind not in self._handlers:
+            raise KeyError(f"No job handler registered for '{kind}'")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise JobQueueFull(f"{self._pending} jobs already pending")
+            self._conn.execute('''INSERT INTO jobs (id, kind, payload, status, progress, result, error, created, updated,
+                                  owner, heartbeat) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                               (job_id, kind, json.dumps(payload), 'queued', 0.0, None, None, now, now, self.owner, now))
+            self._conn.commit()
+            self._pending += 1
+            self._revisions[job_id] = 0
+
+        self._executor.submit(self._run, job_id, kind, payload)
+        return job_id
+
+    def start(self):
+        # Called once per serving process: adopts unfinished jobs now and keeps heartbeating and adopting
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.resume()
+        threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True).start()
+
+    def resume(self):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''UPDATE jobs SET owner = ?, heartbeat = ?
+                                  WHERE status IN ('queued', 'running') AND owner IS NOT ?
+                                  AND (heartbeat IS NULL OR heartbeat < ?)''',
+                               (self.owner, now, self.owner, now - self.stale_after))
+            self._conn.commit()
+            rows = [row for row in self._conn.execute('''SELECT id, kind, payload FROM jobs
+                                                         WHERE status IN ('queued', 'running') AND owner = ?''',
+                                                      (self.owner,)).fetchall()
+                    if row[0] not in self._revisions]
+            self._pending += len(rows)
+            for job_id, _, _ in rows:
+                self._revisions[job_id] = 0
+
+        for job_id, kind, payload in rows:
+            logging.info(f'Resuming job {job_id} ({kind})')
+            self._executor.submit(self._run, job_id, kind, json.loads(payload))
+        return len(rows)
+
+    def orphaned(self, job_id):
+        # True while an unfinished job has no live process refreshing its heartbeat
+        with self._lock:
+            row = self._conn.execute('SELECT status, heartbeat FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return (row is not None and row[0] not in FINISHED
+                and (row[1] is None or row[1] < time.time() - self.stale_after))
+
+    def get(self, job_id):
+        with self._lock:
+            return self._fetch(job_id)
+
+    def wait_for_update(self, job_id, revision, timeout=5):
+        # Local updates wake the waiter at once; updates made by another process show up in `updated`
+        with self._changed:
+            self._changed.wait_for(lambda: revision is None or self._revisions.get(job_id, 0) != revision[0],
+                                   timeout)
+            job = self._fetch(job_id)
+            return (self._revisions.get(job_id, 0), job and job['updated']), job
+
+    def shutdown(self):
+        self._stop.set()
+        self._executor.shutdown(wait=True)
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                with self._lock:
+                    self._conn.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                                       (time.time(), self.owner))
+                    self._conn.commit()
+                self.resume()
+            except sqlite3.Error as e:
+                logging.error(f'Job heartbeat failed: {e}')
+
+    def _fetch(self, job_id):
+        row = self._conn.execute('''SELECT id, kind, status, progress, result, error, created, updated
+                                    FROM jobs WHERE id = ?''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'progress': row[3],
+            'result': json.loads(row[4]) if row[4] else None,
+            'error': row[5],
+            'created': row[6],
+            'updated': row[7]
+        }
+
+    def _update(self, job_id, **fields):
+        fields['updated'] = time.time()
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._changed:
+            self._conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+            self._conn.commit()
+            self._revisions[job_id] = self._revisions.get(job_id, 0) + 1
+            if fields.get('status') in FINISHED:
+                self._pending -= 1
+            self._changed.notify_all()
+
+    def _run(self, job_id, kind, payload):
+        self._update(job_id, status='running')
+
+        def progress(fraction):
+            self._update(job_id, progress=round(fraction, 3))
+
+        try:
+            result = self._handlers[kind](payload, progress)
+            self._update(job_id, status='done', progress=1.0, result=result)
+        except Exception as e:
+            logging.error(f'Job {job_id} ({kind}) failed: {e}')
+            self._update(job_id, status='failed', error=str(e))
@@ -0,0 +1,211 @@
+import os
+import time
+import logging
+import threading
+import psutil
+from engines import check_engine, OnnxModel, onnx_path
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+INCEPTION_CHECKPOINT = os.path.join(BACKEND_DIR, 'resnetinceptionvit.pth')
+AUDIO_CLASSIFIER = os.path.join(BACKEND_DIR, 'audio_classifier.h5')
+
+
+def current_rss():
+    return psutil.Process(os.getpid()).memory_info().rss
+
+
+class ModelHandle:
+    def __init__(self, name, model, load_time, rss):
+        self.name = name
+        self.model = model
+        self.load_time = load_time
+        self.rss = rss
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self.model
+
+    def __exit__(self, exc_type, exc, tb):
+        self._lock.release()
+
+    def run(self, fn, *args, **kwargs):
+        with self as model:
+            return fn(model, *args, **kwargs)
+
+    def stats(self):
+        return {
+            'load_time': round(self.load_time, 3),
+            'rss_mb': round(self.rss / (1024 * 1024), 1)
+        }
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._handles = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, warmup=None):
+        with self._lock:
+            self._loaders[name] = (loader, warmup)
+            self._locks.setdefault(name, threading.Lock())
+
+    def is_registered(self, name):
+        return name in self._loaders
+
+    def get(self, name):
+        handle = self._handles.get(name)
+        if handle is not None:
+            return handle
+
+        if name not in self._loaders:
+            raise KeyError(f"No model registered under '{name}'")
+
+        with self._locks[name]:
+            handle = self._handles.get(name)
+            if handle is None:
+                handle = self._load(name)
+                self._handles[name] = handle
+        return handle
+
+    def preload(self, *names):
+        for name in names or list(self._loaders):
+            self.get(name)
+        return self.stats()
+
+    def stats(self):
+        return {name: handle.stats() for name, handle in self._handles.items()}
+
+    def _load(self, name):
+        loader, warmup = self._loaders[name]
+        rss_before = current_rss()
+        start = time.perf_counter()
+        model = loader()
+        if warmup is not None:
+            warmup(model)
+        load_time = time.perf_counter() - start
+        rss = max(current_rss() - rss_before, 0)
+
+        handle = ModelHandle(name, model, load_time, rss)
+        stats = handle.stats()
+        logging.info(f"Loaded model '{name}' in {stats['load_time']}s, RSS +{stats['rss_mb']} MB")
+        return handle
+
+
+registry = ModelRegistry()
+
+
+def boot_report():
+    process = psutil.Process(os.getpid())
+    return {
+        'time_to_ready_s': round(time.time() - process.create_time(), 3),
+        'rss_mb': round(process.memory_info().rss / (1024 * 1024), 1),
+        'models': registry.stats()
+    }
+
+
+def load_mtcnn(device):
+    from facenet_pytorch import MTCNN
+    return MTCNN(select_largest=False, post_process=False, device=device).to(device).eval()
+
+
+def warmup_mtcnn(mtcnn):
+    from PIL import Image
+    mtcnn(Image.new('RGB', (160, 160)))
+
+
+def load_onnx(checkpoint_path, device, precision):
+    if precision != 'fp32':
+        raise ValueError(f'The onnxruntime engine runs fp32 exports, not {precision}')
+    return OnnxModel(onnx_path(checkpoint_path), device)
+
+
+def load_inception(device, checkpoint_path=INCEPTION_CHECKPOINT, precision='fp32', calibration=None, engine='torch'):
+    import torch
+    from checkpoints import load_module, traced_module
+    from precision import apply_precision
+    check_engine(engine, ['torch', 'torchscript', 'onnxruntime'])
+    if engine == 'onnxruntime':
+        return load_onnx(checkpoint_path, device, precision)
+    if engine == 'torchscript':
+        return traced_module(lambda: load_inception(device, checkpoint_path, precision, calibration),
+                             checkpoint_path, f'{precision}-{torch.device(device).type}',
+                             torch.zeros(1, 3, 160, 160, device=device))
+
+    from facenet_pytorch import InceptionResnetV1
+    # The checkpoint replaces every weight, so the VGGFace2 download and load are skipped
+    model = load_module(lambda: InceptionResnetV1(classify=True, num_classes=1), checkpoint_path,
+                        'model_state_dict', device)
+    return apply_precision(model, precision, device, calibration)
+
+
+def warmup_inception(model):
+    import torch
+    from precision import model_device
+    with torch.no_grad():
+        model(torch.zeros(1, 3, 160, 160, device=model_device(model)))
+
+
+def face_calibration(folder, limit=128, batch_size=16):
+    import torch
+    from PIL import Image
+
+    faces = []
+    with registry.get('mtcnn') as detector:
+        for name in sorted(os.listdir(folder))[:limit]:
+            try:
+                face = detector(Image.open(os.path.join(folder, name)).convert('RGB'))
+            except OSError:
+                continue
+            if face is not None:
+                faces.append(face.float() / 255.0)
+    return [torch.stack(faces[i:i + batch_size]) for i in range(0, len(faces), batch_size)]
+
+
+def load_audio_classifier(model_path=AUDIO_CLASSIFIER, precision='fp32', calibration=None, engine='keras'):
+    check_engine(engine, ['keras', 'onnxruntime'])
+    if engine == 'onnxruntime':
+        return load_onnx(model_path, 'cpu', precision)
+    from tensorflow.keras.models import load_model
+    from precision import keras_precision
+    return keras_precision(load_model(model_path), precision, calibration)
+
+
+def audio_calibration(folder, limit=256):
+    import numpy as np
+    from audio_scoring import extract_windows
+
+    windows = []
+    for name in sorted(os.listdir(folder)):
+        try:
+            windows.append(extract_windows(os.path.join(folder, name))[1])
+        except Exception:
+            continue
+        if sum(len(w) for w in windows) >= limit:
+            break
+    return np.concatenate(windows)[:limit] if windows else None
+
+
+def warmup_audio_classifier(model):
+    import numpy as np
+    model.predict(np.zeros((1, 40, 500), dtype=np.float32), verbose=0)
+
+
+def register_face_models(device, precision='fp32', calibration_folder=None, engine='torch'):
+    if not registry.is_registered('mtcnn'):
+        registry.register('mtcnn', lambda: load_mtcnn(device), warmup_mtcnn)
+    if not registry.is_registered('inception'):
+        calibration = lambda: face_calibration(calibration_folder) if calibration_folder else None
+        registry.register('inception', lambda: load_inception(device, precision=precision, calibration=calibration,
+                                                              engine=engine),
+                          warmup_inception)
+
+
+def register_audio_models(precision='fp32', calibration_folder=None, engine='keras'):
+    if not registry.is_registered('audio_classifier'):
+        calibration = lambda: audio_calibration(calibration_folder) if calibration_folder else None
+        registry.register('audio_classifier',
+                          lambda: load_audio_classifier(precision=precision, calibration=calibration, engine=engine),
+                          warmup_audio_classifier)
@@ -0,0 +1,139 @@
+import copy
+import contextlib
+import numpy as np
+
+PRECISIONS = ['fp32', 'fp16', 'bf16', 'int8_dynamic', 'int8_static']
+# Dynamic quantization in torch only covers nn.Linear, a negligible share of these convolutional models,
+# so int8_dynamic is offered for the Keras audio model (TFLite quantizes its convolutions) only
+TORCH_PRECISIONS = ['fp32', 'fp16', 'bf16', 'int8_static']
+
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f'Unknown precision: {precision}')
+
+
+def autocast(precision, device='cpu'):
+    import torch
+    device_type = torch.device(device).type
+    if precision == 'bf16':
+        return torch.autocast(device_type, dtype=torch.bfloat16)
+    if precision == 'fp16':
+        return torch.autocast(device_type, dtype=torch.float16)
+    return contextlib.nullcontext()
+
+
+def model_device(model):
+    import torch
+    parameter = next(iter(model.parameters()), None)
+    return parameter.device if parameter is not None else torch.device('cpu')
+
+
+def cast_forward(model, precision, device):
+    forward = model.forward
+
+    def autocast_forward(*args, **kwargs):
+        with autocast(precision, device):
+            return forward(*args, **kwargs).float()
+
+    model.forward = autocast_forward
+    return model
+
+
+def quantize_static(model, calibration):
+    import torch
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+
+    batches = list(calibration or [])
+    if not batches:
+        raise ValueError('Static int8 quantization needs calibration batches')
+
+    model = copy.deepcopy(model).cpu().eval()
+    mapping = get_default_qconfig_mapping(torch.backends.quantized.engine)
+    prepared = prepare_fx(model, mapping, example_inputs=(batches[0],))
+    with torch.no_grad():
+        for x in batches:
+            prepared(x)
+    return convert_fx(prepared)
+
+
+def apply_precision(model, precision, device='cpu', calibration=None):
+    import torch
+    check_precision(precision)
+    device_type = torch.device(device).type
+    if precision not in TORCH_PRECISIONS:
+        raise ValueError(f'{precision} would leave the convolutions in fp32; use int8_static instead')
+    if precision == 'fp32':
+        return model
+    if precision == 'fp16' and device_type == 'cpu':
+        # CPU autocast does not support float16 in the pinned torch and would silently run fp32
+        raise ValueError('fp16 needs a CUDA device; use bf16 on the CPU')
+    if precision in ('fp16', 'bf16'):
+        return cast_forward(model, precision, device)
+
+    if device_type != 'cpu':
+        raise ValueError(f'{precision} inference only runs on the CPU')
+    return quantize_static(model, calibration() if callable(calibration) else calibration)
+
+
+class TFLiteModel:
+    def __init__(self, content, threads=None):
+        import tensorflow as tf
+        self.interpreter = tf.lite.Interpreter(model_content=content, num_threads=threads)
+        self._input = self.interpreter.get_input_details()[0]['index']
+        self._output = self.interpreter.get_output_details()[0]['index']
+        self._shape = None
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        if self._shape != x.shape:
+            self.interpreter.resize_tensor_input(self._input, x.shape)
+            self.interpreter.allocate_tensors()
+            self._shape = x.shape
+        self.interpreter.set_tensor(self._input, x)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self._output).copy()
+
+
+def keras_bf16(model):
+    from tensorflow import keras
+
+    def with_policy(layer):
+        config = layer.get_config()
+        if not isinstance(layer, keras.layers.InputLayer):
+            config['dtype'] = 'mixed_bfloat16'
+        return layer.__class__.from_config(config)
+
+    clone = keras.models.clone_model(model, clone_function=with_policy)
+    clone.set_weights(model.get_weights())
+    return clone
+
+
+def keras_tflite(model, precision, calibration=None):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if precision == 'fp16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision in ('int8_dynamic', 'int8_static'):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if precision == 'int8_static':
+        windows = calibration() if callable(calibration) else calibration
+        if windows is None or len(windows) == 0:
+            raise ValueError('Static int8 quantization needs calibration batches')
+        # Ops without an int8 kernel stay in float rather than failing the conversion
+        converter.representative_dataset = lambda: ([np.asarray(window[np.newaxis], dtype=np.float32)]
+                                                    for window in windows)
+    return TFLiteModel(converter.convert())
+
+
+def keras_precision(model, precision, calibration=None):
+    check_precision(precision)
+    if precision == 'fp32':
+        return model
+    if precision == 'bf16':
+        return keras_bf16(model)
+    return keras_tflite(model, precision, calibration)
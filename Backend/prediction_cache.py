@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def checkpoint_version(*paths):
+    fingerprint = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path)
+        fingerprint.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return fingerprint.hexdigest()[:16]
+
+
+class PredictionCache:
+    def __init__(self, path='prediction_cache.db', memory_items=2048, max_entries=200000):
+        self.memory_items = memory_items
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS prediction_cache (
+            content_hash TEXT,
+            modality TEXT,
+            model_version TEXT,
+            result TEXT,
+            last_access REAL,
+            PRIMARY KEY (content_hash, modality, model_version)
+        )''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_prediction_cache_access ON prediction_cache (last_access)')
+        self._conn.commit()
+        self._entries = self._conn.execute('SELECT COUNT(*) FROM prediction_cache').fetchone()[0]
+
+    def invalidate(self, modality, current_version):
+        with self._lock:
+            deleted = self._conn.execute('DELETE FROM prediction_cache WHERE modality = ? AND model_version != ?',
+                                         (modality, current_version)).rowcount
+            self._conn.commit()
+            self._entries -= deleted
+            for key in [key for key in self._memory if key[1] == modality and key[2] != current_version]:
+                del self._memory[key]
+
+    def get(self, content_hash, modality, model_version):
+        key = (content_hash, modality, model_version)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return self._memory[key]
+
+            row = self._conn.execute('''SELECT result FROM prediction_cache
+                                        WHERE content_hash = ? AND modality = ? AND model_version = ?''', key).fetchone()
+            if row is None:
+                self._counters['misses'] += 1
+                return None
+
+            self._conn.execute('''UPDATE prediction_cache SET last_access = ?
+                                  WHERE content_hash = ? AND modality = ? AND model_version = ?''', (time.time(), *key))
+            self._conn.commit()
+            self._counters['disk_hits'] += 1
+            result = json.loads(row[0])
+            self._remember(key, result)
+            return result
+
+    def put(self, content_hash, modality, model_version, result):
+        key = (content_hash, modality, model_version)
+        with self._lock:
+            exists = self._conn.execute('''SELECT 1 FROM prediction_cache
+                                           WHERE content_hash = ? AND modality = ? AND model_version = ?''', key).fetchone()
+            self._conn.execute('INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?, ?)',
+                               (*key, json.dumps(result), time.time()))
+            if exists is None:
+                self._entries += 1
+            self._evict()
+            self._conn.commit()
+            self._remember(key, result)
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(self._counters[name] for name in ('memory_hits', 'disk_hits', 'misses'))
+            hits = self._counters['memory_hits'] + self._counters['disk_hits']
+            return {
+                **self._counters,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0,
+                'memory_entries': len(self._memory),
+                'disk_entries': self._entries
+            }
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _evict(self):
+        overflow = self._entries - self.max_entries
+        if overflow <= 0:
+            return
+        self._conn.execute('''DELETE FROM prediction_cache WHERE rowid IN (
+                              SELECT rowid FROM prediction_cache ORDER BY last_access LIMIT ?)''', (overflow,))
+        self._entries -= overflow
+        self._counters['evictions'] += overflow
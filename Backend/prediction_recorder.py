@@ -0,0 +1,151 @@
+import time
+import queue
+import logging
+import sqlite3
+import threading
+from collections import deque
+
+INSERT_PREDICTION = '''INSERT INTO predictions (date, time, platform, status, confidence, media_format)
+                       VALUES (?, ?, ?, ?, ?, ?)'''
+
+
+def is_busy(error):
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+
+class PredictionRecorder:
+    def __init__(self, database, flush_rows=100, flush_interval_ms=200, on_write=None, retries=5, retry_backoff_ms=50):
+        self.database = database
+        self.on_write = on_write
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.retries = retries
+        self.retry_backoff = retry_backoff_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self._flushes = 0
+        self._rows = 0
+        self._dropped = 0
+        self._rollup_failures = 0
+        self._closed = False
+
+        self._writer = threading.Thread(target=self._run, name='prediction_recorder', daemon=True)
+        self._writer.start()
+
+    def record(self, row):
+        if self._closed:
+            raise RuntimeError('PredictionRecorder is closed')
+        self._queue.put(row)
+
+    def flush(self, timeout=None):
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def stats(self):
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            return {
+                'pending': self._queue.qsize(),
+                'flushes': self._flushes,
+                'rows': self._rows,
+                'dropped_rows': self._dropped,
+                'rollup_failures': self._rollup_failures,
+                'flush_ms_mean': round(sum(latencies) / len(latencies), 3) if latencies else 0,
+                'flush_ms_p95': round(latencies[int(len(latencies) * 0.95)], 3) if latencies else 0,
+                'flush_ms_max': round(latencies[-1], 3) if latencies else 0
+            }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        return conn
+
+    def _write(self, conn, rows):
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                with conn:
+                    conn.executemany(INSERT_PREDICTION, rows)
+                    if self.on_write is not None:
+                        self._write_rollups(conn, rows)
+                break
+            except Exception as e:
+                if attempt < self.retries and is_busy(e):
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+                    continue
+                self._drop(rows, e)
+                return
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._stats_lock:
+            self._latencies.append(elapsed)
+            self._flushes += 1
+            self._rows += len(rows)
+
+    def _write_rollups(self, conn, rows):
+        # A savepoint keeps the prediction rows when only the rollup upsert fails; a backfill can rebuild rollups
+        conn.execute('SAVEPOINT rollups')
+        try:
+            self.on_write(conn, rows)
+        except Exception as e:
+            conn.execute('ROLLBACK TO rollups')
+            conn.execute('RELEASE rollups')
+            if is_busy(e):
+                raise
+            logging.error(f'Failed to update rollups for {len(rows)} prediction records: {e}')
+            with self._stats_lock:
+                self._rollup_failures += 1
+            return
+        conn.execute('RELEASE rollups')
+
+    def _drop(self, rows, error):
+        logging.error(f'Failed to write {len(rows)} prediction records: {error}')
+        with self._stats_lock:
+            self._dropped += len(rows)
+
+    def _run(self):
+        conn = self._connect()
+        rows, waiters = [], []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+
+            if item is None:
+                stopping = True
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not False:
+                rows.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if rows and (stopping or waiters or due or len(rows) >= self.flush_rows):
+                try:
+                    self._write(conn, rows)
+                except Exception as e:
+                    # The thread must outlive any one batch, otherwise every later prediction queues forever
+                    self._drop(rows, e)
+                rows, deadline = [], None
+            for waiter in waiters:
+                waiter.set()
+            waiters = []
+
+        conn.close()
@@ -0,0 +1,115 @@
+import sys
+import sqlite3
+import argparse
+from collections import defaultdict
+
+HISTOGRAM_BUCKETS = 10
+GROUP_COLUMNS = ['platform', 'media_format', 'status']
+
+CREATE_ROLLUPS = '''CREATE TABLE IF NOT EXISTS prediction_rollups (
+    date TEXT,
+    platform TEXT,
+    media_format TEXT,
+    status TEXT,
+    bucket INTEGER,
+    count INTEGER,
+    confidence_sum REAL,
+    PRIMARY KEY (date, platform, media_format, status, bucket)
+)'''
+
+UPSERT_ROLLUP = '''INSERT INTO prediction_rollups (date, platform, media_format, status, bucket, count, confidence_sum)
+                   VALUES (?, ?, ?, ?, ?, 1, ?)
+                   ON CONFLICT (date, platform, media_format, status, bucket)
+                   DO UPDATE SET count = count + 1, confidence_sum = confidence_sum + excluded.confidence_sum'''
+
+BACKFILL_ROLLUPS = f'''INSERT INTO prediction_rollups (date, platform, media_format, status, bucket, count, confidence_sum)
+                       SELECT date, platform, media_format, status,
+                              MIN(CAST(COALESCE(confidence, 0) * {HISTOGRAM_BUCKETS} AS INTEGER), {HISTOGRAM_BUCKETS - 1}),
+                              COUNT(*), SUM(COALESCE(confidence, 0))
+                       FROM predictions
+                       GROUP BY 1, 2, 3, 4, 5'''
+
+
+def bucket(confidence):
+    return min(int(confidence * HISTOGRAM_BUCKETS), HISTOGRAM_BUCKETS - 1)
+
+
+def apply_rows(conn, rows):
+    conn.executemany(UPSERT_ROLLUP, [
+        (date, platform, media_format, status, bucket(confidence), confidence)
+        for date, time, platform, status, confidence, media_format in rows
+    ])
+
+
+def backfill(database):
+    conn = sqlite3.connect(database, isolation_level=None)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(CREATE_ROLLUPS)
+        conn.execute('DELETE FROM prediction_rollups')
+        conn.execute(BACKFILL_ROLLUPS)
+        conn.execute('COMMIT')
+        return conn.execute('SELECT COALESCE(SUM(count), 0) FROM prediction_rollups').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def query_stats(conn, filters):
+    clauses, params = [], []
+    if filters.get('date_from'):
+        clauses.append('date >= ?')
+        params.append(filters['date_from'])
+    if filters.get('date_to'):
+        clauses.append('date <= ?')
+        params.append(filters['date_to'])
+    for name in GROUP_COLUMNS:
+        if filters.get(name):
+            clauses.append(f'{name} = ?')
+            params.append(filters[name])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+    rows = conn.execute(f'''SELECT date, platform, media_format, status, bucket, count, confidence_sum
+                            FROM prediction_rollups {where}''', params).fetchall()
+
+    total, confidence_sum = 0, 0.0
+    histogram = [0] * HISTOGRAM_BUCKETS
+    groups = {name: defaultdict(int) for name in GROUP_COLUMNS}
+    by_day = defaultdict(lambda: defaultdict(int))
+
+    for date, platform, media_format, status, bucket_index, count, bucket_sum in rows:
+        total += count
+        confidence_sum += bucket_sum
+        histogram[bucket_index] += count
+        groups['platform'][platform] += count
+        groups['media_format'][media_format] += count
+        groups['status'][status] += count
+        by_day[date]['count'] += count
+        by_day[date][status] += count
+
+    return {
+        'total': total,
+        'mean_confidence': round(confidence_sum / total, 4) if total else 0,
+        'by_platform': dict(groups['platform']),
+        'by_media_format': dict(groups['media_format']),
+        'by_status': dict(groups['status']),
+        'by_day': [{'date': date, **counts} for date, counts in sorted(by_day.items())],
+        'confidence_histogram': [
+            {'range': [i / HISTOGRAM_BUCKETS, (i + 1) / HISTOGRAM_BUCKETS], 'count': count}
+            for i, count in enumerate(histogram)
+        ]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the prediction statistics rollups')
+    parser.add_argument('command', choices=['backfill'])
+    parser.add_argument('--database', default='predictions.db')
+    args = parser.parse_args()
+
+    if args.command == 'backfill':
+        count = backfill(args.database)
+        print(f'Rebuilt rollups from {count} predictions in {args.database}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,22 @@
+import numpy as np
+import soundfile as sf
+from audio_features import AudioFrontend, DEFAULT_RESAMPLER, check
+
+TOLERANCE = 1e-2
+
+
+def speech_like(path, sr, seconds):
+    rng = np.random.default_rng(0)
+    t = np.arange(sr * seconds) / sr
+    y = 0.3 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t)) + 0.02 * rng.normal(size=len(t))
+    sf.write(path, np.stack([y, 0.5 * y], axis=1).astype(np.float32), sr)
+
+
+def test_default_frontend_matches_librosa_reference(tmp_path):
+    # Covers a native-rate file and one that goes through the block resampler across several blocks
+    paths = []
+    for sr, seconds in ((16000, 5), (44100, 130)):
+        paths.append(str(tmp_path / f'{sr}.wav'))
+        speech_like(paths[-1], sr, seconds)
+    assert AudioFrontend().resampler == DEFAULT_RESAMPLER
+    assert check(paths, AudioFrontend(), TOLERANCE)
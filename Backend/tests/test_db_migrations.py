@@ -0,0 +1,72 @@
+import sqlite3
+import multiprocessing
+from db_migrations import MIGRATIONS, migrate, schema_version
+
+ROWS = [('2024-01-01', '10:00:00', 'instagram', 'fake', 0.91, 'image'),
+        ('2024-01-01', '10:05:00', 'instagram', 'real', 0.12, 'video'),
+        ('2024-01-02', '09:00:00', 'instagram', 'fake', 0.95, 'image')]
+
+
+def legacy_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute('''CREATE TABLE predictions (id INTEGER PRIMARY KEY AUTOINCREMENT, date TEXT, time TEXT,
+                    platform TEXT, status TEXT, confidence REAL, media_format TEXT)''')
+    conn.executemany('INSERT INTO predictions (date, time, platform, status, confidence, media_format) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', ROWS)
+    conn.commit()
+    conn.close()
+
+
+def rollup_count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT SUM(count) FROM prediction_rollups').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_migrate_is_idempotent(tmp_path):
+    path = str(tmp_path / 'predictions.db')
+    legacy_database(path)
+    assert migrate(path) == len(MIGRATIONS)
+    assert migrate(path) == len(MIGRATIONS)
+    assert rollup_count(path) == len(ROWS)
+
+
+def test_backfill_reruns_over_existing_rollups(tmp_path):
+    # An interrupted upgrade can leave rollup rows behind without the version bump
+    path = str(tmp_path / 'predictions.db')
+    legacy_database(path)
+    migrate(path)
+    conn = sqlite3.connect(path)
+    conn.execute(f'PRAGMA user_version = {len(MIGRATIONS) - 1}')
+    conn.commit()
+    conn.close()
+
+    assert migrate(path) == len(MIGRATIONS)
+    assert rollup_count(path) == len(ROWS)
+
+
+def migrate_together(path, barrier, versions):
+    barrier.wait()
+    versions.put(migrate(path))
+
+
+def test_concurrent_migrations(tmp_path):
+    # Serving processes all migrate on import, so several can meet the same legacy database at once
+    path = str(tmp_path / 'predictions.db')
+    legacy_database(path)
+    context = multiprocessing.get_context('spawn')
+    barrier, versions = context.Barrier(6), context.Queue()
+    workers = [context.Process(target=migrate_together, args=(path, barrier, versions)) for _ in range(6)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+
+    assert [worker.exitcode for worker in workers] == [0] * 6
+    assert [versions.get(timeout=1) for _ in workers] == [len(MIGRATIONS)] * 6
+    conn = sqlite3.connect(path)
+    assert schema_version(conn) == len(MIGRATIONS)
+    conn.close()
+    assert rollup_count(path) == len(ROWS)
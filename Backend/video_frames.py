@@ -0,0 +1,38 @@
+import random
+import cv2
+import numpy as np
+
+
+def format_frames(frame, output_size):
+    return cv2.resize(frame, output_size)
+
+
+def frames_from_video_file(video_path, n_frames, output_size=(224, 224), frame_step=15):
+    result = []
+    src = cv2.VideoCapture(video_path)
+    video_length = int(src.get(cv2.CAP_PROP_FRAME_COUNT))
+    need_length = 1 + (n_frames - 1) * frame_step
+
+    start = 0 if need_length > video_length else random.randint(0, video_length - need_length)
+    src.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+    ret, frame = src.read()
+    if not ret:
+        return np.zeros((n_frames, *output_size, 3), dtype=np.uint8)
+
+    result.append(format_frames(frame, output_size))
+
+    for _ in range(n_frames - 1):
+        for _ in range(frame_step):
+            ret, frame = src.read()
+        result.append(format_frames(frame, output_size) if ret else np.zeros_like(result[0]))
+
+    src.release()
+    return np.array(result)
+
+
+def sample_video_frames(path, n_frames=3):
+    frames = frames_from_video_file(path, n_frames)
+    if frames.shape[-1] == 4:
+        frames = frames[..., :3]
+    return np.ascontiguousarray(frames[..., ::-1])
@@ -1,26 +1,43 @@
 import streamlit as st
 import torch
-from facenet_pytorch import MTCNN, InceptionResnetV1
 import cv2
 import os
+import sys
 import random
 import numpy as np
 from PIL import Image
 from fpdf import FPDF
 import base64
-from pytorch_grad_cam import GradCAM
-from pytorch_grad_cam.utils.model_targets import ClassifierOutputTarget
 from pytorch_grad_cam.utils.image import show_cam_on_image
 import torch.nn.functional as F
 from datetime import datetime
 
-# Model setup
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Backend'))
+from model_registry import registry, register_face_models
+from face_preprocessing import FacePreprocessor
+from explanations import ExplanationService
+
+# Frames scored per video. With more than one, the most-fake frame's Grad-CAM is shown instead of the first
+VIDEO_SAMPLES = 1
+# Grad-CAM on the unscaled 0-255 face, as before; False reuses the scoring pass on the [0, 1] input
+CAM_ON_RAW_FACE = True
+
+# Model setup (shared across Streamlit reruns through the process-wide registry)
 device = 'cuda:0' if torch.cuda.is_available() else 'cpu'
-mtcnn = MTCNN(select_largest=False, post_process=False, device=device).eval()
-model = InceptionResnetV1(pretrained='vggface2', classify=True, num_classes=1, device=device)
-checkpoint = torch.load('D:\\DeepTracers\\Backend\\resnetinceptionvit.pth', map_location=device)
-model.load_state_dict(checkpoint['model_state_dict'])
-model.to(device).eval()
+register_face_models(device)
+mtcnn_handle = registry.get('mtcnn')
+model_handle = registry.get('inception')
+
+def raw_faces(faces):
+    x = torch.stack(faces).to(device)
+    return F.interpolate(x, size=(256, 256), mode='bilinear', align_corners=False)
+
+if not registry.is_registered('inception_explainer'):
+    # One service per process, so its hook and cache survive reruns
+    registry.register('inception_explainer', lambda: ExplanationService(
+        model_handle.model, model_handle.model.block8.branch1[-1], FacePreprocessor((256, 256), device=device),
+        cam_preprocessor=raw_faces if CAM_ON_RAW_FACE else None))
+explainer_handle = registry.get('inception_explainer')
 
 # Helper functions
 def format_frames(frame, output_size):
@@ -45,46 +62,38 @@ def frames_from_video_file(video_path, n_frames=3, output_size=(224, 224), frame
     src.release()
     return np.array(result)
 
-def predict(input_image: Image.Image):
-    face = mtcnn(input_image)
-    
-    # If no face is detected, return a message
-    if face is None:
-        return None, "real", None
-    
-    face = face.unsqueeze(0)  # add the batch dimension
-    face = F.interpolate(face, size=(256, 256), mode='bilinear', align_corners=False)
-    
-    # Convert face tensor to numpy array
-    prev_face = face.squeeze(0).permute(1, 2, 0).cpu().detach().numpy()
-    prev_face = prev_face.astype('uint8')
-
-    # Convert the face to float32 and normalize to [0, 1]
-    face_image_to_plot = face.squeeze(0).permute(1, 2, 0).cpu().detach().numpy()
-    face_image_to_plot = face_image_to_plot.astype('float32') / 255.0
-
-    target_layers = [model.block8.branch1[-1]]
-    cam = GradCAM(model=model, target_layers=target_layers)
-    targets = [ClassifierOutputTarget(0)]
-
-    grayscale_cam = cam(input_tensor=face, targets=targets, eigen_smooth=True)
-    grayscale_cam = grayscale_cam[0, :]
-    visualization = show_cam_on_image(face_image_to_plot, grayscale_cam, use_rgb=True)
-    face_with_mask = cv2.addWeighted(prev_face, 1, visualization, 0.5, 0)
-
-    with torch.no_grad():
-        face = face.to(device).float() / 255.0
-        output = torch.sigmoid(model(face).squeeze(0))
-        prediction = "real" if output.item() < 0.8 else "fake"
-        
-        real_prediction = 1 - output.item()
-        fake_prediction = output.item()
-        
+def predict(input_image: Image.Image, explain=None):
+    confidences, prediction, face_with_mask = predict_batch([input_image], explain)[0]
+    return confidences, prediction, face_with_mask
+
+def predict_batch(images, explain=None):
+    # Every detected face is scored and explained in one forward and at most one backward pass
+    with mtcnn_handle as mtcnn, model_handle, explainer_handle as explainer:
+        detected = mtcnn(images)
+        faces = [face for face in detected if face is not None]
+        results = iter(explainer.explain(faces, explain) if faces else [])
+
+    outputs = []
+    for face in detected:
+        # If no face is detected, return a message
+        if face is None:
+            outputs.append((None, "real", None))
+            continue
+        result = next(results)
         confidences = {
-            'real': real_prediction,
-            'fake': fake_prediction
+            'real': 1 - result['fake'],
+            'fake': result['fake']
         }
-    return confidences, prediction, face_with_mask
+        outputs.append((confidences, result['label'], cam_overlay(face, result['cam'])))
+    return outputs
+
+def cam_overlay(face, grayscale_cam):
+    if grayscale_cam is None:
+        return None
+    face = F.interpolate(face.unsqueeze(0), size=grayscale_cam.shape, mode='bilinear', align_corners=False)
+    face = face.squeeze(0).permute(1, 2, 0).cpu().numpy()
+    visualization = show_cam_on_image(face.astype('float32') / 255.0, grayscale_cam, use_rgb=True)
+    return cv2.addWeighted(face.astype('uint8'), 1, visualization, 0.5, 0)
 
 
 # PDF generation function
@@ -268,10 +277,12 @@ def main():
 
         # Check if it's a video
         elif file_extension in ["mp4", "avi", "mov"]:
-            frames = frames_from_video_file(file_path, n_frames=1)  # Get one frame for analysis
-            image = Image.fromarray(frames[0]).convert('RGB')
-            image = image.resize(fixed_size)  # Resize original image
-            confidences, prediction, face_with_mask = predict(image)
+            frames = frames_from_video_file(file_path, n_frames=VIDEO_SAMPLES)
+            images = [Image.fromarray(frame).convert('RGB').resize(fixed_size) for frame in frames]
+            # Show the frame whose face looks most manipulated
+            scored = [(image, output) for image, output in zip(images, predict_batch(images)) if output[0] is not None]
+            image, (confidences, prediction, face_with_mask) = max(
+                scored, key=lambda item: item[1][0]['fake'], default=(images[0], (None, "real", None)))
 
             # Create two columns for side-by-side display
             col1, col2 = st.columns(2)
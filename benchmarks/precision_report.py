@@ -0,0 +1,159 @@
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+import synthetic_media
+from run_benchmarks import AV_CONFIG, AV_WEIGHTS, summarize, build_face_models, build_audio_model, load_av_module
+from precision import PRECISIONS, TORCH_PRECISIONS, apply_precision, keras_precision
+
+MODELS = ['inception', 'audio', 'av']
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def face_inputs(paths, size, normalize):
+    import torch
+    crops = []
+    for path in paths:
+        img = cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB)
+        h, w = img.shape[:2]
+        side = min(h, w)
+        crop = img[(h - side) // 2:(h + side) // 2, (w - side) // 2:(w + side) // 2]
+        crop = cv2.resize(crop, (size, size))
+        crops.extend([crop, crop[:, ::-1]])
+    x = torch.from_numpy(np.ascontiguousarray(crops)).permute(0, 3, 1, 2).float() / 255.0
+    return normalize(x) if normalize else x
+
+
+def time_model(run, x, repeat):
+    run(x)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = run(x)
+        samples.append((time.perf_counter() - start) * 1000)
+    return out, summarize(samples)
+
+
+def parity(reference, probs):
+    diff = np.abs(probs - reference)
+    return {
+        'mean_abs_diff': round(float(diff.mean()), 6),
+        'max_abs_diff': round(float(diff.max()), 6),
+        'label_agreement': round(float(np.mean((probs > 0.5) == (reference > 0.5))), 4)
+    }
+
+
+def report_torch(name, model, x, calibration, modes, repeat):
+    import torch
+
+    def run_with(candidate):
+        def run(batch):
+            with torch.no_grad():
+                return sigmoid(candidate(batch).float().cpu().numpy().reshape(-1))
+        return run
+
+    results, reference = {}, None
+    for mode in [mode for mode in modes if mode in TORCH_PRECISIONS]:
+        try:
+            candidate = apply_precision(copy.deepcopy(model), mode, 'cpu', calibration)
+            probs, latency = time_model(run_with(candidate), x, repeat)
+        except Exception as e:
+            results[mode] = {'error': str(e)}
+            print(f'{name:10s} {mode:13s} failed: {e}')
+            continue
+        reference = probs if mode == 'fp32' else reference
+        results[mode] = {'latency': latency, **(parity(reference, probs) if reference is not None else {})}
+        print(f"{name:10s} {mode:13s} p50 {latency['p50_ms']:9.2f} ms  "
+              f"max diff {results[mode].get('max_abs_diff', float('nan')):.2e}")
+    return results
+
+
+def report_keras(model, x, calibration, modes, repeat):
+    results, reference = {}, None
+    for mode in modes:
+        try:
+            candidate = keras_precision(model, mode, calibration)
+            probs, latency = time_model(lambda batch: np.asarray(candidate.predict(batch, verbose=0),
+                                                                 dtype=np.float32).reshape(-1), x, repeat)
+        except Exception as e:
+            results[mode] = {'error': str(e)}
+            print(f'{"audio":10s} {mode:13s} failed: {e}')
+            continue
+        reference = probs if mode == 'fp32' else reference
+        results[mode] = {'latency': latency, **(parity(reference, probs) if reference is not None else {})}
+        print(f"{'audio':10s} {mode:13s} p50 {latency['p50_ms']:9.2f} ms  "
+              f"max diff {results[mode].get('max_abs_diff', float('nan')):.2e}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency and fp32 parity of every classifier per precision mode')
+    parser.add_argument('--models', default=','.join(MODELS), help='comma separated subset of ' + ','.join(MODELS))
+    parser.add_argument('--modes', default=','.join(m for m in PRECISIONS if m != 'fp16'),
+                        help='comma separated subset of ' + ','.join(PRECISIONS) + ' (fp32 is always the reference)')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--images', help='folder of face images (default: synthetic)')
+    parser.add_argument('--audio', help='folder of audio clips (default: synthetic)')
+    parser.add_argument('--av-arch', default='b7')
+    parser.add_argument('--media-dir', default=os.path.join(tempfile.gettempdir(), 'deeptracers-bench'))
+    parser.add_argument('--output', default='precision_report.json')
+    args = parser.parse_args()
+
+    modes = ['fp32'] + [mode for mode in args.modes.split(',') if mode != 'fp32']
+    media = synthetic_media.generate(args.media_dir)
+    images = ([os.path.join(args.images, name) for name in sorted(os.listdir(args.images))] if args.images
+              else list(media['image'].values()))
+    clips = ([os.path.join(args.audio, name) for name in sorted(os.listdir(args.audio))] if args.audio
+             else list(media['audio'].values()))
+    report = {}
+
+    for name in args.models.split(','):
+        try:
+            if name == 'inception':
+                _, model, weights = build_face_models('cpu')
+                x = face_inputs(images, 160, None)
+                report[name] = {'weights': weights,
+                                'modes': report_torch(name, model, x, [x[:len(x) // 2]], modes, args.repeat)}
+            elif name == 'audio':
+                from audio_scoring import extract_windows
+                model, weights = build_audio_model()
+                x = np.concatenate([extract_windows(path)[1] for path in clips])
+                report[name] = {'weights': weights, 'modes': report_keras(model, x, x, modes, args.repeat)}
+            elif name == 'av':
+                av = load_av_module()
+                with open(AV_CONFIG) as f:
+                    cfg = json.load(f)
+                checkpoints = sorted(entry for entry in os.listdir(AV_WEIGHTS)
+                                     if entry.endswith('.pt')) if os.path.isdir(AV_WEIGHTS) else []
+                if checkpoints and args.av_arch == cfg['arch']:
+                    # One member is enough to compare precisions; the ensemble applies the mode per member
+                    model = av.load_ensemble([os.path.join(AV_WEIGHTS, checkpoints[0])], cfg['arch'], 'cpu').models[0]
+                    weights = 'checkpoint'
+                else:
+                    model, weights = av.EffNet(args.av_arch).eval(), 'random'
+                size = cfg['size']
+                x = face_inputs(images[:2], size, av.preprocess.transforms[1])
+                report[name] = {'weights': weights,
+                                'modes': report_torch(name, model, x, [x], modes, args.repeat)}
+            else:
+                parser.error(f'Unknown model: {name}')
+        except ImportError as e:
+            print(f'Skipping {name}: {e}')
+            report[name] = {'skipped': str(e)}
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
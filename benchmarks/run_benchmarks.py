@@ -0,0 +1,368 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import functools
+import platform
+import tempfile
+import importlib.util
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, 'Backend'))
+sys.path.append(os.path.join(ROOT, 'Audiovisualmodel'))
+
+import synthetic_media
+
+GROUPS = ['image', 'audio', 'video', 'db', 'av', 'engines']
+ENGINE_BATCHES = [1, 16]
+AV_CONFIG = os.path.join(ROOT, 'Audiovisualmodel', 'config.json')
+AV_WEIGHTS = os.path.join(ROOT, 'Audiovisualmodel', 'weights')
+
+
+def peak_rss_mb():
+    # ru_maxrss never goes down, so this is the process high-water mark so far, not one group's own peak
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+
+
+def summarize(samples):
+    samples = np.asarray(samples)
+    return {
+        'n': int(samples.size),
+        'mean_ms': round(float(samples.mean()), 3),
+        'p50_ms': round(float(np.percentile(samples, 50)), 3),
+        'p95_ms': round(float(np.percentile(samples, 95)), 3),
+        'p99_ms': round(float(np.percentile(samples, 99)), 3)
+    }
+
+
+class Recorder:
+    def __init__(self, repeat, warmup=1):
+        self.repeat = repeat
+        self.warmup = warmup
+        self.results = {}
+
+    def time(self, name, fn, *args):
+        for _ in range(self.warmup):
+            result = fn(*args)
+        samples = []
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = fn(*args)
+            samples.append((time.perf_counter() - start) * 1000)
+        self.results[name] = summarize(samples)
+        print(f"{name:40s} p50 {self.results[name]['p50_ms']:10.3f} ms  p95 {self.results[name]['p95_ms']:10.3f} ms")
+        return result
+
+
+@functools.lru_cache(maxsize=None)
+def build_face_models(device):
+    from facenet_pytorch import InceptionResnetV1
+    from model_registry import INCEPTION_CHECKPOINT, load_mtcnn, load_inception
+
+    if os.path.exists(INCEPTION_CHECKPOINT):
+        model, weights = load_inception(device), 'checkpoint'
+    else:
+        model, weights = InceptionResnetV1(classify=True, num_classes=1, device=device).eval(), 'random'
+    return load_mtcnn(device), model, weights
+
+
+def build_audio_model():
+    from model_registry import AUDIO_CLASSIFIER, load_audio_classifier
+    from audio_features import N_MFCC, MAX_LENGTH
+
+    if os.path.exists(AUDIO_CLASSIFIER):
+        return load_audio_classifier(), 'checkpoint'
+
+    from tensorflow import keras
+    model = keras.Sequential([
+        keras.Input(shape=(N_MFCC, MAX_LENGTH)),
+        keras.layers.Conv1D(64, 3, activation='relu'),
+        keras.layers.GlobalAveragePooling1D(),
+        keras.layers.Dense(64, activation='relu'),
+        keras.layers.Dense(1, activation='sigmoid')
+    ])
+    return model, 'random'
+
+
+def load_av_module():
+    spec = importlib.util.spec_from_file_location('deeptracer_av', os.path.join(ROOT, 'Audiovisualmodel', 'deeptracer-av.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_image(recorder, media, device):
+    import torch
+    from PIL import Image
+    from face_preprocessing import FacePreprocessor
+
+    mtcnn, model, weights = build_face_models(device)
+    preprocessor = FacePreprocessor((160, 160), device=device)
+    for size, path in media['image'].items():
+        img = recorder.time(f'image/{size}/decode', lambda: Image.open(path).convert('RGB'))
+        face = recorder.time(f'image/{size}/detect', mtcnn, img)
+        if face is None:
+            print(f'image/{size}: no face detected, skipping classifier stages')
+            continue
+        x = recorder.time(f'image/{size}/preprocess', preprocessor, [face])
+        with torch.no_grad():
+            recorder.time(f'image/{size}/classify', model, x)
+    return {'inception': weights}
+
+
+def bench_audio(recorder, media):
+    from audio_features import load_audio, mfcc_features, N_MFCC, MAX_LENGTH
+    from audio_features import AudioFrontend
+    from audio_scoring import score_audio, score_audio_batch, feature_pool
+    from feature_cache import FeatureCache
+    from model_registry import ModelHandle
+    from ingest import hash_path
+
+    model, weights = build_audio_model()
+    handle = ModelHandle('audio_classifier', model, 0, 0)
+    frontend = AudioFrontend()
+    cache = FeatureCache(os.path.join(tempfile.mkdtemp(), 'feature_cache'))
+    for duration, path in media['audio'].items():
+        y = recorder.time(f'audio/{duration}/decode', load_audio, path)
+        mfccs = recorder.time(f'audio/{duration}/features', mfcc_features, y)
+        recorder.time(f'audio/{duration}/decode_fast', frontend.load, path)
+        recorder.time(f'audio/{duration}/features_fast', frontend.features, y)
+        x = mfccs.reshape(-1, N_MFCC, MAX_LENGTH)
+        recorder.time(f'audio/{duration}/classify', lambda: model.predict(x, verbose=0))
+        recorder.time(f'audio/{duration}/score_windows', score_audio, path, handle)
+        recorder.time(f'audio/{duration}/score_cached_features', score_audio, path, handle, hash_path(path),
+                      frontend, cache)
+
+    paths = list(media['audio'].values())
+    with feature_pool() as pool:
+        recorder.time('audio/all/score_sequential', lambda: [score_audio(path, handle, frontend=frontend) for path in paths])
+        recorder.time('audio/all/score_batch', score_audio_batch, paths, handle, frontend, 0.5, None, None, pool)
+    return {'audio_classifier': weights}
+
+
+def bench_video(recorder, media, device):
+    import torch
+    from video_frames import sample_video_frames
+    from face_preprocessing import FacePreprocessor
+
+    mtcnn, model, weights = build_face_models(device)
+    preprocessor = FacePreprocessor((160, 160), device=device)
+    for spec, path in media['video'].items():
+        frames = recorder.time(f'video/{spec}/decode', sample_video_frames, path)
+        faces = recorder.time(f'video/{spec}/detect', mtcnn, frames)
+        faces = [face for face in faces if face is not None]
+        if not faces:
+            print(f'video/{spec}: no face detected, skipping classifier stages')
+            continue
+        x = recorder.time(f'video/{spec}/preprocess', preprocessor, faces)
+        with torch.no_grad():
+            recorder.time(f'video/{spec}/classify', model, x)
+    return {'inception': weights}
+
+
+def bench_db(recorder, workdir):
+    from db_migrations import migrate
+    from stats_rollups import apply_rows
+    from prediction_recorder import PredictionRecorder
+
+    database = os.path.join(workdir, 'bench_predictions.db')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database + suffix):
+            os.remove(database + suffix)
+    migrate(database)
+
+    writer = PredictionRecorder(database, on_write=apply_rows)
+    row = ('2024-10-01', '12:00:00', 'instagram', 'fake', 0.91, 'image')
+
+    def write(n):
+        for _ in range(n):
+            writer.record(row)
+        writer.flush()
+
+    recorder.time('db/write_1', write, 1)
+    recorder.time('db/write_100', write, 100)
+    writer.close()
+    return {}
+
+
+def bench_av(recorder, media, device, arch):
+    from model_registry import registry
+    from dface import MTCNN, FaceNet
+
+    av = load_av_module()
+    with open(AV_CONFIG) as f:
+        cfg = json.load(f)
+    trained_arch, cfg['arch'] = cfg['arch'], arch
+
+    model_paths = sorted(os.path.join(AV_WEIGHTS, name) for name in os.listdir(AV_WEIGHTS)
+                         if name.endswith('.pt')) if os.path.isdir(AV_WEIGHTS) else []
+    if model_paths and arch == trained_arch:
+        build, weights = (lambda: av.load_ensemble(model_paths, arch, device)), 'checkpoint'
+    else:
+        build, weights = (lambda: av.Ensemble([av.EffNet(arch)]).eval().to(device)), 'random'
+
+    if not registry.is_registered('deepware'):
+        registry.register('dface_mtcnn', lambda: MTCNN(device))
+        registry.register('facenet', lambda: FaceNet(device))
+        registry.register('deepware', build)
+    av.init(AV_WEIGHTS, json.dumps(cfg), device)
+
+    for spec, path in media['video'].items():
+        batches = recorder.time(f'av/{spec}/decode', lambda: list(av.get_frames(path, av.batch_size, av.scan_fps)))
+        batch = batches[0]
+        results = recorder.time(f'av/{spec}/detect', av.detect_faces, batch)
+        faces = recorder.time(f'av/{spec}/crop', av.extract_faces, batch, results)
+        if not faces:
+            print(f'av/{spec}: no face detected, skipping classifier stages')
+            continue
+        x = recorder.time(f'av/{spec}/preprocess', av.preprocess_faces, faces)
+        recorder.time(f'av/{spec}/classify', av.classify, x)
+    return {'deepware': weights}
+
+
+def bench_engines(recorder, workdir):
+    import torch
+    from engines import OnnxModel, onnx_path, export_torch, export_keras
+    from audio_features import N_MFCC, MAX_LENGTH
+
+    def time_batches(name, run, make_input):
+        for batch in ENGINE_BATCHES:
+            stage = f'engines/{name}/b{batch}'
+            recorder.time(stage, run, make_input(batch))
+            recorder.results[stage]['items_per_s'] = round(batch * 1000 / max(recorder.results[stage]['p50_ms'], 1e-6), 1)
+
+    weights = {}
+    onnx_dir = os.path.join(workdir, 'onnx')
+    os.makedirs(onnx_dir, exist_ok=True)
+    faces = lambda batch: torch.rand(batch, 3, 160, 160)
+
+    _, model, weights['inception'] = build_face_models('cpu')
+    with torch.no_grad():
+        time_batches('inception/torch', model, faces)
+    # Prefer an exported model that sits next to the checkpoint; otherwise export the one in use
+    from model_registry import INCEPTION_CHECKPOINT
+    path = onnx_path(INCEPTION_CHECKPOINT)
+    if weights['inception'] != 'checkpoint' or not os.path.exists(path):
+        path = export_torch(model, os.path.join(onnx_dir, 'inception.onnx'), (3, 160, 160))
+    time_batches('inception/onnxruntime', OnnxModel(path), faces)
+
+    try:
+        from model_registry import AUDIO_CLASSIFIER
+        model, weights['audio'] = build_audio_model()
+        mfccs = lambda batch: np.random.normal(0, 50, (batch, N_MFCC, MAX_LENGTH)).astype(np.float32)
+        time_batches('audio/keras', lambda x: model.predict(x, verbose=0), mfccs)
+        path = onnx_path(AUDIO_CLASSIFIER)
+        if weights['audio'] != 'checkpoint' or not os.path.exists(path):
+            path = export_keras(model, os.path.join(onnx_dir, 'audio.onnx'))
+        time_batches('audio/onnxruntime', OnnxModel(path), mfccs)
+    except ImportError as e:
+        print(f'Skipping engines/audio: {e}')
+    return weights
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, stats in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None or previous['p50_ms'] <= 0:
+            continue
+        change = stats['p50_ms'] / previous['p50_ms'] - 1
+        if change > threshold:
+            regressions.append({'stage': name, 'baseline_p50_ms': previous['p50_ms'],
+                                'p50_ms': stats['p50_ms'], 'change': round(change, 3)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stage-level benchmarks for every DeepTracers inference path')
+    parser.add_argument('--groups', default=','.join(GROUPS), help='comma separated subset of ' + ','.join(GROUPS))
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--threads', type=int, default=0, help='torch intra-op threads (0 keeps the default)')
+    parser.add_argument('--av-arch', default='b7')
+    parser.add_argument('--media-dir', default=os.path.join(tempfile.gettempdir(), 'deeptracers-bench'))
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='compare against a previously saved result file')
+    parser.add_argument('--threshold', type=float, default=0.15, help='allowed relative p50 slowdown')
+    parser.add_argument('--save-baseline', help='also write the results to this path')
+    args = parser.parse_args()
+
+    import torch
+    random.seed(0)
+    np.random.seed(0)
+    torch.manual_seed(0)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    device = 'cpu'
+
+    media = synthetic_media.generate(args.media_dir)
+    recorder = Recorder(args.repeat)
+    weights, rss_high_water, skipped = {}, {}, {}
+
+    for group in args.groups.split(','):
+        try:
+            if group == 'image':
+                weights.update(bench_image(recorder, media, device))
+            elif group == 'audio':
+                weights.update(bench_audio(recorder, media))
+            elif group == 'video':
+                weights.update(bench_video(recorder, media, device))
+            elif group == 'db':
+                weights.update(bench_db(recorder, args.media_dir))
+            elif group == 'av':
+                weights.update(bench_av(recorder, media, device, args.av_arch))
+            elif group == 'engines':
+                weights.update({f'engines/{name}': value
+                                for name, value in bench_engines(recorder, args.media_dir).items()})
+            else:
+                parser.error(f'Unknown group: {group}')
+        except ImportError as e:
+            skipped[group] = str(e)
+            print(f'Skipping {group}: {e}')
+            continue
+        rss_high_water[group] = peak_rss_mb()
+
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'threads': torch.get_num_threads(),
+            'repeat': args.repeat,
+            'weights': weights,
+            'skipped': skipped
+        },
+        # Cumulative across groups in the order they ran; run one group per invocation for per-group peaks
+        'rss_high_water_mb': rss_high_water,
+        'results': recorder.results
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(recorder.results, json.load(f), args.threshold)
+        report['regressions'] = regressions
+        for regression in regressions:
+            print(f"REGRESSION {regression['stage']}: {regression['baseline_p50_ms']} -> {regression['p50_ms']} ms "
+                  f"(+{regression['change'] * 100:.1f}%)")
+
+    for path in filter(None, [args.output, args.save_baseline]):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import os
+import wave
+import cv2
+import numpy as np
+
+IMAGE_SIZES = [(256, 256), (640, 480), (1280, 720), (1920, 1080)]
+AUDIO_SECONDS = [2, 8, 30, 120]
+VIDEO_SPECS = [(5, 25), (15, 30), (60, 30)]
+
+
+def draw_face(canvas, center, size, rng):
+    cx, cy = center
+    w, h = size
+    skin = tuple(int(c) for c in rng.integers(120, 220, size=3))
+    cv2.ellipse(canvas, (cx, cy), (w // 2, h // 2), 0, 0, 360, skin, -1)
+    for dx in (-w // 5, w // 5):
+        cv2.circle(canvas, (cx + dx, cy - h // 8), max(w // 14, 2), (40, 30, 30), -1)
+    cv2.line(canvas, (cx, cy - h // 16), (cx, cy + h // 10), (90, 70, 70), max(w // 40, 1))
+    cv2.ellipse(canvas, (cx, cy + h // 4), (w // 6, h // 16), 0, 0, 180, (60, 40, 120), max(w // 40, 1))
+    return canvas
+
+
+def face_image(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    canvas = rng.integers(0, 60, size=(height, width, 3), dtype=np.uint8)
+    face_w = min(width, height) // 3
+    return draw_face(canvas, (width // 2, height // 2), (face_w, int(face_w * 1.3)), rng)
+
+
+def write_image(path, width, height, seed=0):
+    cv2.imwrite(path, face_image(width, height, seed))
+    return path
+
+
+def write_wav(path, seconds, sr=16000, seed=0):
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.5 * t)
+    signal = 0.4 * np.sin(2 * np.pi * np.cumsum(pitch) / sr) + 0.05 * rng.standard_normal(t.shape)
+    samples = (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+    with wave.open(path, 'wb') as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(sr)
+        out.writeframes(samples.tobytes())
+    return path
+
+
+def write_video(path, seconds, fps, width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 60, size=(height, width, 3), dtype=np.uint8)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    face_w = min(width, height) // 3
+    for i in range(int(seconds * fps)):
+        frame = background.copy()
+        cx = width // 2 + int(width * 0.1 * np.sin(i / fps))
+        draw_face(frame, (cx, height // 2), (face_w, int(face_w * 1.3)), np.random.default_rng(seed))
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def generate(folder):
+    os.makedirs(folder, exist_ok=True)
+    media = {'image': {}, 'audio': {}, 'video': {}}
+    for width, height in IMAGE_SIZES:
+        path = os.path.join(folder, f'face_{width}x{height}.jpg')
+        media['image'][f'{width}x{height}'] = path if os.path.exists(path) else write_image(path, width, height)
+    for seconds in AUDIO_SECONDS:
+        path = os.path.join(folder, f'voice_{seconds}s.wav')
+        media['audio'][f'{seconds}s'] = path if os.path.exists(path) else write_wav(path, seconds)
+    for seconds, fps in VIDEO_SPECS:
+        path = os.path.join(folder, f'clip_{seconds}s_{fps}fps.mp4')
+        media['video'][f'{seconds}s@{fps}'] = path if os.path.exists(path) else write_video(path, seconds, fps)
+    return media